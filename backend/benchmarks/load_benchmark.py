@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""Load test for the API against a local mongod.
+
+Seeds a throwaway database, boots the app with uvicorn, drives every scenario
+with a pool of concurrent clients and writes throughput and latency
+percentiles to a JSON results file. Passing --compare with an earlier results
+file prints the change per scenario and exits non-zero when a p95 regressed by
+more than --max-regression percent.
+
+The app has no school entity, so each school adds its own set of class names
+(e.g. "م2 3/ب") and the seeded volume is
+schools x classes x students per class x records per student.
+
+Usage:
+    python benchmarks/load_benchmark.py [--mongo-url mongodb://localhost:27017]
+        [--schools 1] [--classes 12] [--students 30] [--records 20]
+        [--requests 500] [--concurrency 16] [--output results.json]
+        [--compare baseline.json]
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import openpyxl
+import requests
+from pymongo import MongoClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# server.py only needs these to build its (lazy) Mongo client
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(BACKEND_DIR))
+
+from passwords import hash_password  # noqa: E402
+from server import BehaviorRecord, Student, User  # noqa: E402
+
+PASSWORD = "123456"
+TEACHER_EMAIL = "teacher@benchmark.local"
+ADMIN_EMAIL = "admin@benchmark.local"
+SECTIONS = "أبجدهو"
+SCENARIOS = ["login", "students_list", "top_by_class", "statistics", "reports", "behavior_post", "import"]
+
+
+def class_names(schools: int, classes: int) -> list:
+    names = []
+    for school in range(schools):
+        prefix = f"م{school + 1} " if schools > 1 else ""
+        for i in range(classes):
+            names.append(f"{prefix}{i // len(SECTIONS) + 1}/{SECTIONS[i % len(SECTIONS)]}")
+    return names
+
+
+def seed(database, args) -> dict:
+    """Fills database with the configured volume and returns what the scenarios need."""
+    rng = random.Random(args.seed)
+    password_hash = hash_password(PASSWORD)
+    now = datetime.now(timezone.utc)
+
+    staff = [User(name="معلمة الأداء", email=TEACHER_EMAIL, role="teacher"),
+             User(name="إدارة الأداء", email=ADMIN_EMAIL, role="admin")]
+    database.users.insert_many([{**user.model_dump(), "password_hash": password_hash} for user in staff])
+    teacher_id = staff[0].id
+
+    student_ids = []
+    classes = class_names(args.schools, args.classes)
+    for class_name in classes:
+        users, students, records = [], [], []
+        for number in range(args.students):
+            user = User(name=f"طالبة {number + 1}", email=f"{uuid.uuid4().hex}@benchmark.local", role="student")
+            users.append({**user.model_dump(), "password_hash": password_hash})
+            student = Student(user_id=user.id, name=user.name, class_name=class_name)
+            for _ in range(args.records):
+                behavior_type = rng.choice(("positive", "positive", "negative"))
+                points = rng.randint(1, 10)
+                student.total_points += points if behavior_type == "positive" else -points
+                date = now - timedelta(days=rng.uniform(0, 45))
+                records.append(BehaviorRecord(
+                    student_id=student.id, teacher_id=teacher_id, behavior_type=behavior_type,
+                    points=points, description="سلوك تجريبي", date=date, created_at=date
+                ).model_dump())
+            students.append(student.model_dump())
+            student_ids.append(student.id)
+        database.users.insert_many(users, ordered=False)
+        database.students.insert_many(students, ordered=False)
+        if records:
+            database.behavior_records.insert_many(records, ordered=False)
+
+    return {"classes": classes, "student_ids": student_ids}
+
+
+def run_manage(env: dict, *command: str):
+    subprocess.run([sys.executable, "manage.py", *command], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start within 60 seconds")
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 2) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if count else 0.0,
+    }
+
+
+class Driver:
+    def __init__(self, base_url: str, token: str, data: dict, rng_seed: int):
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.data = data
+        self.rng = random.Random(rng_seed)
+        self.local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def login(self):
+        return self.session.post(f"{self.base_url}/api/auth/login",
+                                 json={"username": TEACHER_EMAIL, "password": PASSWORD})
+
+    def students_list(self):
+        return self.session.get(f"{self.base_url}/api/students", headers=self.headers,
+                                params={"class_name": self.rng.choice(self.data["classes"]), "limit": 100})
+
+    def top_by_class(self):
+        return self.session.get(f"{self.base_url}/api/students/top/by-class", headers=self.headers)
+
+    def statistics(self):
+        return self.session.get(f"{self.base_url}/api/statistics", headers=self.headers)
+
+    def reports(self):
+        report_type = self.rng.choice(("weekly", "monthly"))
+        return self.session.get(f"{self.base_url}/api/reports/{report_type}", headers=self.headers,
+                                params={"class_name": self.rng.choice(self.data["classes"])})
+
+    def behavior_post(self):
+        return self.session.post(f"{self.base_url}/api/behavior", headers=self.headers, json={
+            "student_id": self.rng.choice(self.data["student_ids"]),
+            "behavior_type": self.rng.choice(("positive", "negative")),
+            "points": self.rng.randint(1, 10),
+            "description": "سلوك من اختبار الأداء"
+        })
+
+    def run(self, scenario: str, total: int, concurrency: int, warmup: int) -> dict:
+        call = getattr(self, scenario)
+        for _ in range(warmup):
+            call()
+
+        def timed_call(_):
+            start = time.perf_counter()
+            try:
+                ok = call().ok
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(timed_call, range(total)))
+        elapsed = time.perf_counter() - start
+        return summarize([latency for latency, ok in results if ok], sum(1 for _, ok in results if not ok), elapsed)
+
+    def run_import(self, runs: int, rows: int) -> dict:
+        # Measures upload to completed job, since the import itself runs in the background
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["الاسم"])
+        for number in range(rows):
+            sheet.append([f"طالبة مستوردة {number + 1}"])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        content = buffer.getvalue()
+
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for run in range(runs):
+            started = time.perf_counter()
+            response = self.session.post(
+                f"{self.base_url}/api/students/import", headers=self.headers,
+                params={"class_name": f"استيراد/{run + 1}"},
+                files={"file": ("students.xlsx", content,
+                                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+            )
+            if response.status_code != 202:
+                errors += 1
+                continue
+            job_id = response.json()["id"]
+            while True:
+                job = self.session.get(f"{self.base_url}/api/import-jobs/{job_id}", headers=self.headers).json()
+                if job["status"] in ("completed", "failed"):
+                    break
+                time.sleep(0.05)
+            if job["status"] == "completed" and job["added_count"] == rows:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        result = summarize(latencies, errors, time.perf_counter() - start)
+        result["rows_per_second"] = round(rows * len(latencies) / sum(latencies), 1) if latencies else 0.0
+        return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> bool:
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\ncompared with {baseline_path} ({baseline.get('revision', 'unknown')})")
+    regressed = False
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        flag = ""
+        if change > max_regression:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"  {scenario:<14} p95 {previous['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms  ({change:+.1f}%){flag}")
+    return not regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default=None, help="defaults to a fresh benchmark_<random> database")
+    parser.add_argument("--keep-db", action="store_true", help="don't drop the seeded database afterwards")
+    parser.add_argument("--schools", type=int, default=1)
+    parser.add_argument("--classes", type=int, default=12, help="classes per school")
+    parser.add_argument("--students", type=int, default=30, help="students per class")
+    parser.add_argument("--records", type=int, default=20, help="behavior records per student")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--import-runs", type=int, default=3)
+    parser.add_argument("--import-rows", type=int, default=500)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset to run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1, help="random seed for data and request mix")
+    parser.add_argument("--output", default=None, help="results file, defaults to benchmarks/results/")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="allowed p95 increase in percent")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    db_name = args.db_name or f"benchmark_{uuid.uuid4().hex[:8]}"
+    env = {**os.environ, "MONGO_URL": args.mongo_url, "DB_NAME": db_name,
+           "JWT_SECRET_KEY": uuid.uuid4().hex, "CORS_ORIGINS": "*"}
+    mongo = MongoClient(args.mongo_url)
+    database = mongo[db_name]
+    if database.list_collection_names():
+        parser.error(f"database {db_name} is not empty")
+
+    server = None
+    try:
+        started = time.perf_counter()
+        data = seed(database, args)
+        run_manage(env, "backfill-rollups")
+        seed_seconds = time.perf_counter() - started
+        print(f"seeded {len(data['student_ids'])} students in {len(data['classes'])} classes "
+              f"with {len(data['student_ids']) * args.records} behavior records in {seed_seconds:.1f}s")
+
+        server = start_server(env, args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+        token = requests.post(f"{base_url}/api/auth/login",
+                              json={"username": ADMIN_EMAIL, "password": PASSWORD}).json()["access_token"]
+        driver = Driver(base_url, token, data, args.seed)
+
+        results = {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count()},
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "compare", "mongo_url", "db_name", "keep_db")},
+            "seed_seconds": round(seed_seconds, 1),
+            "scenarios": {},
+        }
+        print(f"{'scenario':<14} {'req':>6} {'err':>4} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for scenario in scenarios:
+            if scenario == "import":
+                summary = driver.run_import(args.import_runs, args.import_rows)
+            else:
+                summary = driver.run(scenario, args.requests, args.concurrency, args.warmup)
+            results["scenarios"][scenario] = summary
+            print(f"{scenario:<14} {summary['requests']:>6} {summary['errors']:>4} {summary['throughput_rps']:>8} "
+                  f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if not args.keep_db:
+            mongo.drop_database(db_name)
+        mongo.close()
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{results['revision']}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"\nresults written to {output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Compares serialization of a large student list before and after the fast path.
+
+"before" is what FastAPI does for ``response_model=List[Student]``: validate every
+item, dump it to JSON-compatible data and encode it with the stdlib encoder.
+"after" hands the stored documents straight to ORJSONResponse. Compressed sizes
+and timings are reported for the payload the fast path produces.
+
+Usage:
+    python benchmarks/serialization_benchmark.py [--students 1500] [--repeat 50]
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+import brotli
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+# server.py only needs these to build its (lazy) Mongo client
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server import Student, BROTLI_QUALITY, GZIP_LEVEL  # noqa: E402
+
+
+def make_students(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "name": f"طالبة رقم {i}",
+            "class_name": f"{i % 3 + 1}/{'أبج'[i % 3]}",
+            "total_points": i % 50,
+            "created_at": now - timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def before(students: List[dict], adapter: TypeAdapter) -> bytes:
+    validated = adapter.validate_python(students)
+    content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return JSONResponse({"items": content, "next_cursor": None}).body
+
+
+def after(students: List[dict]) -> bytes:
+    return ORJSONResponse({"items": students, "next_cursor": None}).body
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    timed.last_result = result
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    students = make_students(args.students)
+    adapter = TypeAdapter(List[Student])
+
+    before_seconds = timed(lambda: before(students, adapter), args.repeat)
+    before_size = len(timed.last_result)
+    after_seconds = timed(lambda: after(students), args.repeat)
+    payload = timed.last_result
+
+    gzip_seconds = timed(lambda: gzip.compress(payload, GZIP_LEVEL), args.repeat)
+    gzip_size = len(timed.last_result)
+    br_seconds = timed(lambda: brotli.compress(payload, quality=BROTLI_QUALITY), args.repeat)
+    br_size = len(timed.last_result)
+
+    print(f"{args.students} students, mean of {args.repeat} runs")
+    print(f"  before (validate + stdlib json): {before_seconds * 1000:8.2f} ms  {before_size:>9} bytes")
+    print(f"  after  (orjson fast path):       {after_seconds * 1000:8.2f} ms  {len(payload):>9} bytes")
+    print(f"  speedup:                         {before_seconds / after_seconds:8.1f}x")
+    print(f"  gzip level {GZIP_LEVEL}:                    {gzip_seconds * 1000:8.2f} ms  {gzip_size:>9} bytes")
+    print(f"  br quality {BROTLI_QUALITY}:                    {br_seconds * 1000:8.2f} ms  {br_size:>9} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Measures how long a fresh worker takes to become ready and how much memory it holds.
+
+Each run starts a new interpreter, so nothing is served from an already
+populated module cache:
+
+- import: time to ``import server`` and the resident set size afterwards,
+  plus whether pandas and openpyxl were loaded along the way;
+- ready: time from spawning uvicorn until ``GET /api/`` answers, and the
+  server's resident set size at that point.
+
+Index creation is switched off (CREATE_INDEXES_ON_STARTUP=false) so the numbers
+describe the app rather than MongoDB, and no mongod is needed. Exits non-zero
+when a median exceeds --max-ready-ms or --max-rss-mb.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--max-ready-ms 3000] [--max-rss-mb 150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import server
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": sorted(name for name in ("pandas", "openpyxl", "numpy") if name in sys.modules),
+}))
+"""
+
+
+def rss_mb(pid: int):
+    # Linux only; other platforms report None
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def measure_import(env: dict) -> dict:
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return {
+        "import_ms": result["seconds"] * 1000,
+        # ru_maxrss is in kilobytes on Linux
+        "import_rss_mb": result["max_rss_kb"] / 1024,
+        "heavy_modules": result["heavy_modules"],
+    }
+
+
+def measure_ready(env: dict, port: int) -> dict:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("uvicorn did not become ready within 60 seconds")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/", timeout=1):
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        return {"ready_ms": (time.perf_counter() - started) * 1000, "ready_rss_mb": rss_mb(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--max-ready-ms", type=float, default=None, help="fail when the median ready time exceeds this")
+    parser.add_argument("--max-rss-mb", type=float, default=None, help="fail when the median ready RSS exceeds this")
+    parser.add_argument("--output", default=None, help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    env = {
+        **os.environ,
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+        "DB_NAME": os.environ.get("DB_NAME", "startup_benchmark"),
+        "CREATE_INDEXES_ON_STARTUP": "false",
+    }
+
+    runs = []
+    for _ in range(args.runs):
+        runs.append({**measure_import(env), **measure_ready(env, args.port)})
+
+    summary = {}
+    for key in ("import_ms", "import_rss_mb", "ready_ms", "ready_rss_mb"):
+        values = [run[key] for run in runs if run[key] is not None]
+        summary[key] = round(statistics.median(values), 1) if values else None
+    summary["heavy_modules"] = runs[-1]["heavy_modules"]
+
+    print(f"{args.runs} runs, medians")
+    print(f"  import server: {summary['import_ms']:8.1f} ms  {summary['import_rss_mb']:6.1f} MB max RSS")
+    ready_rss = f"{summary['ready_rss_mb']:6.1f} MB RSS" if summary["ready_rss_mb"] is not None else "RSS n/a"
+    print(f"  ready:         {summary['ready_ms']:8.1f} ms  {ready_rss}")
+    print(f"  heavy modules loaded at import: {', '.join(summary['heavy_modules']) or 'none'}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"summary": summary, "runs": runs}, indent=2))
+
+    failed = False
+    if args.max_ready_ms is not None and summary["ready_ms"] > args.max_ready_ms:
+        print(f"ready time {summary['ready_ms']} ms exceeds {args.max_ready_ms} ms")
+        failed = True
+    if args.max_rss_mb is not None and summary["ready_rss_mb"] is not None and summary["ready_rss_mb"] > args.max_rss_mb:
+        print(f"RSS {summary['ready_rss_mb']} MB exceeds {args.max_rss_mb} MB")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the Tamayyuz backend.
+
+Usage:
+    python manage.py ensure-indexes
+    python manage.py backfill-rollups
+    python manage.py migrate-dates [--batch-size N]
+    python manage.py index-student-names [--batch-size N]
+"""
+import argparse
+import asyncio
+
+from server import backfill_daily_rollups, backfill_name_search_fields, client, ensure_indexes, migrate_string_dates
+
+
+async def run_ensure_indexes(args):
+    created = await ensure_indexes()
+    for collection_name, index_names in created.items():
+        print(f"{collection_name}: {', '.join(index_names)}")
+
+
+async def run_backfill_rollups(args):
+    # $merge needs the unique (student_id, day) index
+    await ensure_indexes()
+    await backfill_daily_rollups()
+    print("behavior_daily_rollups backfilled from earlier behavior_records, reports now read the rollups")
+
+
+async def run_migrate_dates(args):
+    await migrate_string_dates(batch_size=args.batch_size)
+    print("string dates converted to native datetimes")
+
+
+async def run_index_student_names(args):
+    await backfill_name_search_fields(batch_size=args.batch_size)
+    print("student names indexed for search")
+
+
+COMMANDS = {
+    "ensure-indexes": run_ensure_indexes,
+    "backfill-rollups": run_backfill_rollups,
+    "migrate-dates": run_migrate_dates,
+    "index-student-names": run_index_student_names,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamayyuz backend maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ensure-indexes", help="Create the MongoDB indexes the API relies on")
+    subparsers.add_parser(
+        "backfill-rollups", help="Count behavior_records from before rollups into behavior_daily_rollups (safe to re-run)"
+    )
+    migrate_dates = subparsers.add_parser(
+        "migrate-dates", help="Convert ISO string dates to native datetimes (resumable)"
+    )
+    migrate_dates.add_argument("--batch-size", type=int, default=1000)
+    index_names = subparsers.add_parser(
+        "index-student-names", help="Add the normalized search fields to students created before search (resumable)"
+    )
+    index_names.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(COMMANDS[args.command](args))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""bcrypt helpers run in the password pool.
+
+Kept apart from server.py so the pool's spawned workers import only bcrypt
+when they unpickle these functions, not the whole app.
+"""
+from typing import List
+
+import bcrypt
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    return [hash_password(password) for password in passwords]
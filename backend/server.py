@@ -1,26 +1,116 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Request, Response
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError
 import os
+import asyncio
+import base64
+import contextvars
+import csv
+import heapq
+import hashlib
+import hmac
+import io
+import json
 import logging
+import math
+import multiprocessing
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
+from urllib.parse import quote
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
+import brotli
 import jwt
-import pandas as pd
-import io
+import orjson
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from passwords import hash_password, hash_passwords, verify_password
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics, exported in Prometheus format at /api/metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # lets a scraper in without an admin login
+MONGO_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template',
+    ['method', 'route', 'status']
+)
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests being served', ['method', 'route'])
+PASSWORD_POOL_WAIT = Histogram('password_pool_wait_seconds', 'Time bcrypt jobs wait for a free pool worker')
+PASSWORD_POOL_RUN = Histogram('password_pool_run_seconds', 'Time bcrypt jobs take once a worker is free')
+MONGO_COMMAND_LATENCY = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency by command and collection',
+    ['command', 'collection'], buckets=MONGO_LATENCY_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    'mongodb_command_failures_total', 'MongoDB commands that returned an error',
+    ['command', 'collection']
+)
+REQUEST_DB_ROUND_TRIPS = Histogram(
+    'http_request_db_round_trips', 'MongoDB commands issued per HTTP request', ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+)
+
+# Per-request database accounting: requests issuing more MongoDB commands than
+# the budget are logged with the commands they repeated
+DB_ROUND_TRIP_BUDGET = int(os.environ.get('DB_ROUND_TRIP_BUDGET', '10'))
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+
+# (command, collection, seconds) for each command the current request issued.
+# Motor copies the context into the thread that runs each command, so the
+# listener below appends to the list of the request that issued it.
+request_db_calls: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar('request_db_calls', default=None)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    # pymongo calls these from the threads Motor runs commands on; only the started
+    # event carries the command, so its collection is kept until the command finishes
+    def __init__(self):
+        self.collections = {}  # (connection id, request id) -> collection name
+    
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            target = event.command.get('collection')  # getMore names the cursor id first
+        self.collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ''
+    
+    def finished(self, event) -> str:
+        collection = self.collections.pop((event.connection_id, event.request_id), '')
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        calls = request_db_calls.get()
+        if calls is not None:
+            calls.append((event.command_name, collection, event.duration_micros / 1e6))
+        return collection
+    
+    def succeeded(self, event):
+        self.finished(event)
+    
+    def failed(self, event):
+        MONGO_COMMAND_FAILURES.labels(event.command_name, self.finished(event)).inc()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # JWT Configuration
@@ -28,12 +118,121 @@ SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-product
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
+# Index Configuration
+CREATE_INDEXES_ON_STARTUP = os.environ.get('CREATE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+
+# Password Hashing Pool Configuration
+PASSWORD_POOL_WORKERS = int(os.environ.get('PASSWORD_POOL_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_POOL_MAX_QUEUE = int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', '1000'))  # waiting jobs before 503
+PASSWORD_POOL_RESERVED = int(os.environ.get('PASSWORD_POOL_RESERVED', '1'))  # workers bulk hashing leaves to logins
+PASSWORD_BULK_CHUNK_SIZE = int(os.environ.get('PASSWORD_BULK_CHUNK_SIZE', '4'))  # passwords per bulk pool job
+
+# Import Configuration
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))  # rows per bulk insert
+IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', '2'))
+IMPORT_QUEUE_MAX = int(os.environ.get('IMPORT_QUEUE_MAX', '20'))  # queued uploads before 503
+IMPORT_SPOOL_DIR = os.environ.get('IMPORT_SPOOL_DIR') or None  # defaults to the system temp dir
+
 security = HTTPBearer()
 
+# Leaderboard Cache Configuration
+LEADERBOARD_MAX_STUDENTS = int(os.environ.get('LEADERBOARD_MAX_STUDENTS', '50000'))  # larger schools read from MongoDB
+LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '300'))
+
+# User Cache Configuration
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '5000'))
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+
+# Statistics Cache Configuration
+STATISTICS_CACHE_SECONDS = float(os.environ.get('STATISTICS_CACHE_SECONDS', '10'))
+
+# Compression Configuration
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))  # bytes
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+# Already-compressed payloads and live event streams are sent as they are
+UNCOMPRESSED_MEDIA_TYPES = ('text/event-stream', 'application/zip', 'application/vnd.openxmlformats-officedocument.', 'image/')
+
+# Live Events Configuration
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', '100'))  # pending events per subscriber before it must resync
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', '1000'))
+EVENTS_KEEPALIVE_SECONDS = float(os.environ.get('EVENTS_KEEPALIVE_SECONDS', '15'))
+EVENTS_MAX_STREAM_SECONDS = float(os.environ.get('EVENTS_MAX_STREAM_SECONDS', '300'))  # clients reconnect after this
+
+# Profiler Configuration
+PROFILER_MAX_STACKS = int(os.environ.get('PROFILER_MAX_STACKS', '20000'))  # distinct stacks kept before folding
+
+# Report Export Configuration
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))  # rows per cursor batch and per chunk
+
+# Deployment model: the API can run as several worker processes (uvicorn
+# --workers, or several containers behind a load balancer) on one MongoDB, and
+# MongoDB is the only state they share. What each worker keeps for itself:
+# - the leaderboard cache, used only while it holds every write up to the
+#   current data version (DataVersions, in MongoDB), otherwise read from MongoDB;
+# - the statistics cache, keyed on the same data version;
+# - the user cache: another worker's deletion of a user takes effect here after
+#   at most USER_CACHE_TTL_SECONDS;
+# - the live event broker: a dashboard is sent the events of writes handled by
+#   the worker its stream is connected to. Streams end after
+#   EVENTS_MAX_STREAM_SECONDS and clients resync when they reconnect, which
+#   bounds how long a change made through another worker goes unseen;
+# - queued and running roster imports, marked failed when their worker stops.
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
+# Indexes backing the queries below, keyed by collection. Names are fixed so
+# ensure_indexes is idempotent and safe to run on every start and before deploys.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    "students": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("name", ASCENDING), ("class_name", ASCENDING)], name="name_class_name"),
+        IndexModel([("total_points", DESCENDING)], name="total_points"),
+        IndexModel([("class_name", ASCENDING), ("total_points", DESCENDING)], name="class_name_total_points"),
+        IndexModel([("class_name", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)], name="class_name_name_id"),
+        IndexModel([("name_tokens", ASCENDING)], name="name_tokens"),
+        IndexModel([("class_name", ASCENDING), ("name_tokens", ASCENDING)], name="class_name_name_tokens"),
+    ],
+    "behavior_records": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("student_id", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], name="student_id_date_id"),
+        IndexModel([("date", DESCENDING)], name="date"),
+        IndexModel([("behavior_type", ASCENDING)], name="behavior_type"),
+    ],
+    "behavior_daily_rollups": [
+        IndexModel([("student_id", ASCENDING), ("day", ASCENDING)], name="student_id_day_unique", unique=True),
+    ],
+    "import_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+}
+
+# Indexes replaced by a wider one above, dropped by ensure_indexes
+OBSOLETE_INDEXES = {
+    "behavior_records": ["student_id_date"],
+}
+
+async def ensure_indexes(database=None) -> dict:
+    database = database if database is not None else db
+    for collection_name, index_names in OBSOLETE_INDEXES.items():
+        existing = await database[collection_name].index_information()
+        for index_name in index_names:
+            if index_name in existing:
+                await database[collection_name].drop_index(index_name)
+    
+    created = {}
+    for collection_name, indexes in INDEXES.items():
+        created[collection_name] = await database[collection_name].create_indexes(indexes)
+    return created
+
 # Models
 class UserRole(BaseModel):
     ADMIN: str = "admin"
@@ -96,6 +295,54 @@ class BehaviorRecordCreate(BaseModel):
     points: int
     description: str
 
+class ImportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"  # queued, running, completed, failed
+    filename: str
+    class_name: Optional[str] = None
+    created_by: str
+    rows_processed: int = 0
+    added_count: int = 0
+    skipped_count: int = 0
+    errors: List[str] = []
+    message: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+class BulkBehaviorCreate(BaseModel):
+    student_ids: Optional[List[str]] = None
+    class_name: Optional[str] = None  # Award the whole class when student_ids isn't given
+    behavior_type: str
+    points: int
+    description: str
+
+class BulkBehaviorResult(BaseModel):
+    student_id: str
+    success: bool
+    record_id: Optional[str] = None
+    error: Optional[str] = None
+
+class StudentPage(BaseModel):
+    items: List[Student]
+    next_cursor: Optional[str] = None
+
+class BehaviorRecordPage(BaseModel):
+    items: List[BehaviorRecord]
+    next_cursor: Optional[str] = None
+
+class BehaviorSummary(BaseModel):
+    positive_count: int = 0
+    negative_count: int = 0
+    positive_points: int = 0
+    negative_points: int = 0
+
+class ProfilerSettings(BaseModel):
+    enabled: bool
+    routes: List[str] = []  # route templates, e.g. /api/students/{student_id}; empty means every route
+    sample_rate: float = 0.1  # fraction of matching requests that are profiled
+    interval_ms: float = 5
+
 class Statistics(BaseModel):
     total_students: int
     total_positive_records: int
@@ -103,12 +350,846 @@ class Statistics(BaseModel):
     top_students: List[dict]
     recent_activities: List[dict]
 
-# Helper functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# bcrypt is CPU-bound, so it runs in a process pool instead of on the event loop.
+# The pool is created on first use; the semaphore bounds jobs handed to the pool
+# and everything waiting on it counts as queued. The functions it runs live in
+# passwords.py, so spawned workers import bcrypt rather than this module.
+password_pool: Optional[ProcessPoolExecutor] = None
+password_pool_slots = asyncio.Semaphore(PASSWORD_POOL_WORKERS)
+password_bulk_slots = asyncio.Semaphore(max(1, PASSWORD_POOL_WORKERS - PASSWORD_POOL_RESERVED))
+password_pool_stats = {
+    "queued": 0,
+    "running": 0,
+    "completed": 0,
+    "rejected": 0,
+    "max_queued": 0,
+    "total_wait_seconds": 0.0,
+}
+
+def get_password_pool() -> ProcessPoolExecutor:
+    global password_pool
+    if password_pool is None:
+        # spawn rather than fork: the parent already runs Motor's threads
+        password_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_POOL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return password_pool
+
+async def run_in_password_pool(func, *args):
+    if password_pool_stats['queued'] >= PASSWORD_POOL_MAX_QUEUE:
+        password_pool_stats['rejected'] += 1
+        raise HTTPException(status_code=503, detail="الخادم مشغول حالياً، يرجى المحاولة بعد قليل")
+    
+    password_pool_stats['queued'] += 1
+    password_pool_stats['max_queued'] = max(password_pool_stats['max_queued'], password_pool_stats['queued'])
+    queued_at = time.perf_counter()
+    try:
+        await password_pool_slots.acquire()
+    finally:
+        password_pool_stats['queued'] -= 1
+    started_at = time.perf_counter()
+    password_pool_stats['total_wait_seconds'] += started_at - queued_at
+    PASSWORD_POOL_WAIT.observe(started_at - queued_at)
+    
+    password_pool_stats['running'] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_password_pool(), func, *args)
+    finally:
+        PASSWORD_POOL_RUN.observe(time.perf_counter() - started_at)
+        password_pool_stats['running'] -= 1
+        password_pool_stats['completed'] += 1
+        password_pool_slots.release()
+
+async def hash_password_async(password: str) -> str:
+    return await run_in_password_pool(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await run_in_password_pool(verify_password, password, hashed)
+
+async def hash_passwords_async(passwords: List[str]) -> List[str]:
+    # Bulk hashing (roster imports) is split into small jobs that first take one of
+    # the bulk slots, so at most PASSWORD_POOL_WORKERS - PASSWORD_POOL_RESERVED of
+    # them are running or queued at once. A login arriving mid-import waits behind
+    # a few passwords rather than the whole batch, and with several workers it
+    # finds a reserved one free.
+    if not passwords:
+        return []
+    
+    async def hash_chunk(chunk: List[str]) -> List[str]:
+        async with password_bulk_slots:
+            return await run_in_password_pool(hash_passwords, chunk)
+    
+    chunks = [passwords[i:i + PASSWORD_BULK_CHUNK_SIZE] for i in range(0, len(passwords), PASSWORD_BULK_CHUNK_SIZE)]
+    results = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+    return [hashed for chunk in results for hashed in chunk]
+
+# Uploaded rosters are spooled to disk and processed by background workers; the
+# bounded queue holds (job_id, spool path, class_name) until a worker picks it up
+import_queue: asyncio.Queue = asyncio.Queue(maxsize=IMPORT_QUEUE_MAX)
+import_workers: List[asyncio.Task] = []
+pending_import_jobs = {}  # job_id -> spool path
+
+def remove_spool(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+# pandas and openpyxl are imported where they are used rather than at module
+# load: they take longer to import than the rest of the app together and only
+# the import and export paths need them. Both paths run them in worker threads.
+def open_roster(path: str) -> tuple:
+    # Returns (columns, row iterator, close); .xlsx files are streamed row by row
+    # with openpyxl's read-only mode so memory stays flat regardless of file size
+    if path.endswith('.xls'):
+        # openpyxl can't read the legacy format, fall back to a full pandas read
+        import pandas as pd
+        df = pd.read_excel(path)
+        return [str(c).strip() for c in df.columns], iter(df.to_dict('records')), lambda: None
+    
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    sheet_rows = workbook.active.iter_rows(values_only=True)
+    header = next(sheet_rows, ())
+    columns = [str(c).strip() if c is not None else '' for c in header]
+    rows = (dict(zip(columns, values)) for values in sheet_rows)
+    return columns, rows, workbook.close
+
+def cell_text(value) -> str:
+    # Empty cells come back as None from openpyxl and NaN from pandas
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    # Numeric cells such as passwords shouldn't gain a trailing ".0"
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+# Student names are searched in a normalized form so common Arabic spelling
+# variants match: diacritics and tatweel are dropped, hamza forms of alef become
+# a bare alef, taa marbuta becomes haa and alef maqsura becomes yaa. Every token
+# is also stored without a leading "ال" so "الزهراء" is found by "زهراء".
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_LETTER_VARIANTS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي'})
+
+def normalize_arabic(text: str) -> str:
+    text = ARABIC_DIACRITICS.sub('', text).translate(ARABIC_LETTER_VARIANTS).lower()
+    return ' '.join(text.split())
+
+def name_search_fields(name: str) -> dict:
+    normalized = normalize_arabic(name)
+    tokens = normalized.split()
+    tokens += [token[2:] for token in tokens if token.startswith('ال') and len(token) > 3]
+    return {"name_normalized": normalized, "name_tokens": list(dict.fromkeys(tokens))}
+
+def student_document(student: Student) -> dict:
+    return {**student.model_dump(), **name_search_fields(student.name)}
+
+def points_delta(behavior_type: str, points: int) -> int:
+    return points if behavior_type == "positive" else -points
+
+def sum_if_behavior(behavior_type: str, value) -> dict:
+    return {"$sum": {"$cond": [{"$eq": ["$behavior_type", behavior_type]}, value, 0]}}
+
+def behavior_totals() -> dict:
+    # $group accumulators for ROLLUP_FIELDS over raw behavior records
+    return {
+        "positive_count": sum_if_behavior("positive", 1),
+        "negative_count": sum_if_behavior("negative", 1),
+        "positive_points": sum_if_behavior("positive", "$points"),
+        "negative_points": sum_if_behavior("negative", "$points")
+    }
+
+# Reports read per-student per-day counters from behavior_daily_rollups instead of
+# raw behavior_records; every write to behavior_records applies the matching update
+REPORTED_BEHAVIOR_TYPES = ('positive', 'negative')
+ROLLUP_FIELDS = ('positive_count', 'negative_count', 'positive_points', 'negative_points')
+
+# The write handlers $inc the rollup fields for records created once rollups were
+# live (live_since, recorded by the first start). Records from before that are
+# counted into separate backfill_* fields by backfill_daily_rollups, which sets
+# rather than adds them, so it can run and re-run while behavior is recorded.
+# Until it has completed once, reports are computed from the raw records.
+rollup_state = {"live_since": None, "backfilled": False, "warned": False}
+
+async def load_rollup_state(database=None) -> dict:
+    database = database if database is not None else db
+    state = await database.migrations.find_one({"_id": "daily_rollups"})
+    if state is None:
+        await database.migrations.update_one(
+            {"_id": "daily_rollups"},
+            {"$setOnInsert": {"live_since": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        state = await database.migrations.find_one({"_id": "daily_rollups"})
+    rollup_state['live_since'] = state['live_since']
+    rollup_state['backfilled'] = state.get('backfilled_at') is not None
+    return state
+
+async def reports_use_rollups() -> bool:
+    if not rollup_state['backfilled']:
+        await load_rollup_state()
+    if not rollup_state['backfilled'] and not rollup_state['warned']:
+        rollup_state['warned'] = True
+        logger.warning("Daily rollups have not been backfilled, reports read behavior_records until "
+                       "`python manage.py backfill-rollups` has run")
+    return rollup_state['backfilled']
+
+def rollup_day(date) -> str:
+    # Records not yet converted by `manage.py migrate-dates` still hold ISO strings
+    if isinstance(date, str):
+        return date[:10]
+    return date.astimezone(timezone.utc).strftime('%Y-%m-%d')
+
+def predates_rollups(behavior: dict) -> bool:
+    created_at = behavior.get('created_at')
+    if isinstance(created_at, str):
+        return True
+    live_since = rollup_state['live_since']
+    return live_since is not None and created_at is not None and created_at < live_since
+
+def rollup_update(behavior: dict, sign: int = 1) -> Optional[UpdateOne]:
+    if behavior['behavior_type'] not in REPORTED_BEHAVIOR_TYPES:
+        return None
+    behavior_type = behavior['behavior_type']
+    # Deleting a record from before rollups went live takes it off the backfilled counts
+    prefix = 'backfill_' if predates_rollups(behavior) else ''
+    return UpdateOne(
+        {"student_id": behavior['student_id'], "day": rollup_day(behavior['date'])},
+        {"$inc": {
+            f"{prefix}{behavior_type}_count": sign,
+            f"{prefix}{behavior_type}_points": sign * behavior['points']
+        }},
+        upsert=True
+    )
+
+async def apply_rollup_updates(behaviors: List[dict], sign: int = 1):
+    updates = [update for update in (rollup_update(b, sign) for b in behaviors) if update is not None]
+    if updates:
+        await db.behavior_daily_rollups.bulk_write(updates, ordered=False)
+
+async def backfill_daily_rollups(database=None):
+    # Counts the records created before rollups went live in one server-side pass
+    # and writes them to the backfill_* fields. Rollups the pass didn't produce
+    # (their older records were all deleted since) have those fields reset.
+    database = database if database is not None else db
+    state = await load_rollup_state(database)
+    run_id = uuid.uuid4().hex
+    pipeline = [
+        {"$match": {
+            "behavior_type": {"$in": list(REPORTED_BEHAVIOR_TYPES)},
+            "$or": [{"created_at": {"$lt": state['live_since']}}, {"created_at": {"$type": "string"}}]
+        }},
+        {"$group": {
+            # ISO strings and dates converted with $toString both start with the UTC day
+            "_id": {"student_id": "$student_id", "day": {"$substrBytes": [{"$toString": "$date"}, 0, 10]}},
+            **behavior_totals()
+        }},
+        {"$project": {
+            "_id": 0,
+            "student_id": "$_id.student_id",
+            "day": "$_id.day",
+            "backfill_run": {"$literal": run_id},
+            **{f"backfill_{field}": f"${field}" for field in ROLLUP_FIELDS}
+        }},
+        {"$merge": {
+            "into": "behavior_daily_rollups",
+            "on": ["student_id", "day"],
+            "whenMatched": [{"$set": {
+                field: f"$$new.{field}" for field in ("backfill_run", *(f"backfill_{f}" for f in ROLLUP_FIELDS))
+            }}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+    await database.behavior_records.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    await database.behavior_daily_rollups.update_many(
+        {"backfill_run": {"$ne": run_id}, "$or": [{f"backfill_{field}": {"$exists": True}} for field in ROLLUP_FIELDS]},
+        {"$set": {"backfill_run": run_id, **{f"backfill_{field}": 0 for field in ROLLUP_FIELDS}}}
+    )
+    await database.migrations.update_one(
+        {"_id": "daily_rollups"},
+        {"$set": {"backfilled_at": datetime.now(timezone.utc)}}
+    )
+
+# Leaderboards are read far more often than points change, so each worker keeps
+# per-class rankings in memory and the write handlers update them in place.
+# The cache records the data version it holds: each local write moves it on by
+# the version its bump returns, and readers use the cache only while it holds
+# the current version. After a write made by another worker it is behind, and
+# reads go to MongoDB until the next periodic rebuild. Above max_students the
+# cache switches itself off and reads go to MongoDB too.
+class Leaderboard:
+    catch_up_passes = 3
+    
+    def __init__(self, max_students: int, refresh_seconds: int):
+        self.max_students = max_students
+        self.refresh_seconds = refresh_seconds
+        self.students = {}  # student id -> student document
+        self.rankings = {}  # class_name -> sorted [(-total_points, student id)]
+        self.enabled = False
+        self.loaded_at = None
+        self.rebuilding = False
+        self.touched = set()  # students written while a rebuild is loading
+        self.stale = False
+        self.version = None  # data version the rankings hold
+        self.lock = asyncio.Lock()
+    
+    def is_fresh(self) -> bool:
+        return (
+            self.loaded_at is not None
+            and not self.stale
+            and time.monotonic() - self.loaded_at < self.refresh_seconds
+        )
+    
+    async def ensure_loaded(self) -> bool:
+        if not self.is_fresh():
+            async with self.lock:
+                if not self.is_fresh():
+                    await self.rebuild()
+        return self.enabled
+    
+    async def rebuild(self):
+        self.rebuilding = True
+        self.stale = False
+        self.touched = set()
+        try:
+            # Read before the snapshot, so the snapshot holds at least this version;
+            # local writes while it loads move it on through advance()
+            self.version = await data_versions.current()
+            # Build aside and swap, readers keep the previous rankings meanwhile
+            students = {}
+            rankings = {}
+            enabled = await db.students.count_documents({}) <= self.max_students
+            if enabled:
+                async for student in db.students.find({}, STUDENT_PROJECTION):
+                    students[student['id']] = student
+                    rankings.setdefault(student.get('class_name', ''), []).append(
+                        (-student.get('total_points', 0), student['id'])
+                    )
+                for ranking in rankings.values():
+                    ranking.sort()
+            self.students, self.rankings, self.enabled = students, rankings, enabled
+            
+            # The snapshot may or may not include writes made while it was loading,
+            # so the students they touched are read again. Writes during that read
+            # are caught by the next pass; only if they keep coming is the whole
+            # snapshot reloaded on a later read.
+            for _ in range(self.catch_up_passes):
+                if not self.touched or not self.enabled:
+                    break
+                await self._reload_touched()
+            if self.touched and self.enabled:
+                self.stale = True
+            self.loaded_at = time.monotonic()
+        finally:
+            self.rebuilding = False
+            self.touched = set()
+    
+    async def _reload_touched(self):
+        touched, self.touched = self.touched, set()
+        fresh = await db.students.find({"id": {"$in": list(touched)}}, STUDENT_PROJECTION).to_list(None)
+        for student_id in touched:
+            self._discard(student_id)
+        for student in fresh:
+            self._insert(student)
+        if len(self.students) > self.max_students:
+            self.students, self.rankings, self.enabled = {}, {}, False
+    
+    def is_current(self, version: int) -> bool:
+        return self.enabled and not self.rebuilding and self.version == version
+    
+    def advance(self, version: int):
+        # Called once a local write has been applied (or recorded as touched) and its
+        # bump returned the new version. A step of one means no other worker wrote
+        # in between; a bigger step leaves the cache behind.
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+    
+    def _accepts_writes(self, *student_ids: str) -> bool:
+        if self.rebuilding:
+            # Applied by the rebuild once its snapshot is loaded
+            self.touched.update(student_ids)
+            return False
+        return self.enabled
+    
+    def _insert(self, student: dict):
+        self.students[student['id']] = student
+        ranking = self.rankings.setdefault(student.get('class_name', ''), [])
+        insort(ranking, (-student.get('total_points', 0), student['id']))
+    
+    def _discard(self, student_id: str) -> Optional[dict]:
+        student = self.students.pop(student_id, None)
+        if student is None:
+            return None
+        class_name = student.get('class_name', '')
+        ranking = self.rankings[class_name]
+        key = (-student.get('total_points', 0), student_id)
+        i = bisect_left(ranking, key)
+        if i < len(ranking) and ranking[i] == key:
+            del ranking[i]
+        if not ranking:
+            del self.rankings[class_name]
+        return student
+    
+    def add_students(self, students: List[dict]):
+        if not self._accepts_writes(*(student['id'] for student in students)):
+            return
+        if len(self.students) + len(students) > self.max_students:
+            self.students = {}
+            self.rankings = {}
+            self.enabled = False
+            return
+        for student in students:
+            # Drop the ObjectId insert_one/insert_many add and the search fields
+            self._insert({k: v for k, v in student.items() if k in Student.model_fields})
+    
+    def remove_student(self, student_id: str):
+        if self._accepts_writes(student_id):
+            self._discard(student_id)
+    
+    def adjust_points(self, student_id: str, points_change: int):
+        if not self._accepts_writes(student_id):
+            return
+        student = self._discard(student_id)
+        if student is not None:
+            self._insert({**student, 'total_points': student.get('total_points', 0) + points_change})
+    
+    def top_by_class(self, n: int) -> dict:
+        return {
+            class_name: [self.students[student_id] for _, student_id in ranking[:n]]
+            for class_name, ranking in self.rankings.items()
+        }
+    
+    def top_overall(self, n: int) -> List[dict]:
+        return [self.students[student_id] for _, student_id in islice(heapq.merge(*self.rankings.values()), n)]
+
+leaderboard = Leaderboard(LEADERBOARD_MAX_STUDENTS, LEADERBOARD_REFRESH_SECONDS)
+
+# Authenticated users are cached by id so most requests skip the users lookup.
+# Entries expire after ttl_seconds and the least recently used are evicted past
+# max_size; handlers that delete a user drop its entry straight away.
+class UserCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # user id -> (expires_at, user document)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[user_id]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(entry[1])
+    
+    def put(self, user: dict):
+        self.entries[user['id']] = (time.monotonic() + self.ttl_seconds, dict(user))
+        self.entries.move_to_end(user['id'])
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def invalidate(self, user_id: str):
+        self.entries.pop(user_id, None)
+    
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses
+        }
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+# The admin statistics are cached with the data version they were computed at
+# (see DataVersions). A student or behavior write on any worker bumps that
+# version, so the next read recomputes them; reads in between, from however many
+# open dashboards, share the cached value and concurrent misses share one
+# computation. STATISTICS_CACHE_SECONDS bounds their age for changes made
+# outside the API. The version is read before computing, so a write that
+# lands during a computation is picked up by the following read.
+statistics_cache = {"value": None, "version": None, "expires_at": 0.0}
+statistics_lock = asyncio.Lock()
+
+# Every write to students or their behavior records bumps a version counter,
+# overall and for the student's class. The counters live in MongoDB so a write
+# handled by one worker changes the ETags every worker hands out, and the
+# overall version tells this worker's caches whether they are still current. Reads that
+# depend only on that data derive their ETag from the version and their query
+# parameters, so a client that already holds the current representation gets a
+# 304 after one lookup by _id instead of the query itself.
+class DataVersions:
+    OVERALL = "all"
+    
+    def key(self, class_name: Optional[str]) -> str:
+        return self.OVERALL if class_name is None else f"class:{class_name}"
+    
+    async def bump(self, *class_names: str) -> int:
+        class_updates = [
+            UpdateOne({"_id": self.key(class_name)}, {"$inc": {"version": 1}}, upsert=True)
+            for class_name in dict.fromkeys(class_names)
+        ]
+        pending = [db.data_versions.find_one_and_update(
+            {"_id": self.OVERALL}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )]
+        if class_updates:
+            pending.append(db.data_versions.bulk_write(class_updates, ordered=False))
+        overall = (await asyncio.gather(*pending))[0]
+        # Every caller has already applied the write to the leaderboard
+        leaderboard.advance(overall['version'])
+        return overall['version']
+    
+    async def current(self, class_name: Optional[str] = None) -> int:
+        doc = await db.data_versions.find_one({"_id": self.key(class_name)})
+        return doc['version'] if doc else 0
+    
+    async def etag(self, request: Request, class_name: Optional[str] = None, *parts: str) -> str:
+        return self.tag(request, await self.current(class_name), *parts)
+    
+    def tag(self, request: Request, version: int, *parts: str) -> str:
+        # limit, cursor, n, q and the rest select different representations of the same data
+        params = repr([request.url.path, sorted(request.query_params.multi_items())])
+        digest = hashlib.blake2s(params.encode('utf-8'), digest_size=8).hexdigest()
+        return 'W/"' + '.'.join([str(version), digest, *parts]) + '"'
+
+data_versions = DataVersions()
+
+def etag_headers(etag: str) -> dict:
+    # no-cache lets browsers keep the response but revalidate it on every use
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return None
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    if '*' in tags or etag.removeprefix('W/') in tags:
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
+
+# Behavior changes are pushed to dashboards over server-sent events. Each
+# subscriber gets its own bounded queue and a frame is encoded once however many
+# subscribers receive it. A subscriber that falls EVENTS_QUEUE_SIZE events behind
+# has its backlog dropped and is sent a single resync event, so a slow client
+# never holds up writers or grows the server's memory.
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+class EventBroker:
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = {}  # class name (None for every class) -> set of queues
+        self.count = 0
+        self.published = 0
+        self.resyncs = 0
+    
+    def is_full(self) -> bool:
+        return self.count >= self.max_subscribers
+    
+    def subscribe(self, class_name: Optional[str]) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(class_name, set()).add(queue)
+        self.count += 1
+        return queue
+    
+    def unsubscribe(self, class_name: Optional[str], queue: asyncio.Queue):
+        queues = self.subscribers.get(class_name)
+        if queues is None or queue not in queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[class_name]
+        self.count -= 1
+    
+    def has_subscribers(self) -> bool:
+        return self.count > 0
+    
+    def publish(self, event_type: str, class_name: Optional[str], data: dict):
+        queues = [*self.subscribers.get(class_name, ()), *self.subscribers.get(None, ())]
+        if not queues:
+            return
+        frame = b"event: " + event_type.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+        self.published += 1
+        for queue in queues:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_FRAME)
+                self.resyncs += 1
+    
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.count,
+            "max_subscribers": self.max_subscribers,
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "resyncs": self.resyncs
+        }
+
+event_broker = EventBroker(EVENTS_QUEUE_SIZE, EVENTS_MAX_SUBSCRIBERS)
+
+EVENT_STUDENT_PROJECTION = {"_id": 0, "id": 1, "name": 1, "class_name": 1, "total_points": 1}
+
+def publish_behavior_event(event_type: str, student: dict, record: dict, points_change: int):
+    event_broker.publish(event_type, student.get('class_name'), {
+        "student_id": student['id'],
+        "student_name": student.get('name'),
+        "class_name": student.get('class_name'),
+        "total_points": student.get('total_points', 0),
+        "points_change": points_change,
+        # insert_one adds the ObjectId to the inserted document
+        "record": {key: value for key, value in record.items() if key != '_id'}
+    })
+
+# Sampling profiler for live requests, switched on by an admin. A background
+# thread wakes every interval and records one stack per profiled request that
+# is in flight: the event loop thread's stack when that request is running, or
+# its chain of awaiting coroutines (ending in [await]) while it waits on
+# MongoDB, the bcrypt pool or a worker thread. Counts are kept as collapsed
+# stacks, the input format of flamegraph.pl and speedscope. Nothing is sampled
+# while no profiled request is in flight.
+class SamplingProfiler:
+    def __init__(self, max_stacks: int):
+        self.max_stacks = max_stacks
+        self.enabled = False
+        self.routes = set()
+        self.sample_rate = 0.1
+        self.interval = 0.005
+        self.active = {}  # request task -> route template
+        self.stacks = {}  # collapsed stack -> samples
+        self.samples = 0
+        self.profiled_requests = 0
+        self.labels = {}  # code object -> frame label
+        self.loop_thread_id = None
+        self.stop_event = None
+        self.thread = None
+    
+    def configure(self, settings: ProfilerSettings):
+        self.routes = set(settings.routes)
+        self.sample_rate = settings.sample_rate
+        self.interval = settings.interval_ms / 1000
+        self.enabled = settings.enabled
+        if self.enabled and self.thread is None:
+            self.loop_thread_id = threading.get_ident()
+            self.stop_event = threading.Event()
+            self.thread = threading.Thread(target=self.run, args=(self.stop_event,), name="sampling-profiler", daemon=True)
+            self.thread.start()
+        elif not self.enabled and self.thread is not None:
+            self.stop_event.set()
+            self.thread = None
+            self.active.clear()
+    
+    def should_profile(self, route: str) -> bool:
+        return self.enabled and (not self.routes or route in self.routes) and random.random() < self.sample_rate
+    
+    def begin(self, task: asyncio.Task, route: str):
+        self.active[task] = route
+        self.profiled_requests += 1
+    
+    def end(self, task: asyncio.Task):
+        self.active.pop(task, None)
+    
+    def run(self, stop_event: threading.Event):
+        while not stop_event.wait(self.interval):
+            if self.active:
+                self.sample()
+    
+    def label(self, code) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            path = '/'.join(Path(code.co_filename).parts[-2:])
+            label = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(';', ':')
+            self.labels[code] = label
+        return label
+    
+    def running_stack(self, root_code) -> List[str]:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        # Drop the event loop's own frames above the request's coroutine
+        if root_code in codes:
+            codes = codes[codes.index(root_code):]
+        return [self.label(code) for code in codes]
+    
+    def waiting_stack(self, coro) -> List[str]:
+        stack = []
+        while coro is not None:
+            frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+            if frame is None:
+                break
+            stack.append(self.label(frame.f_code))
+            coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+        stack.append('[await]')
+        return stack
+    
+    def sample(self):
+        for task, route in list(self.active.items()):
+            coro = task.get_coro()
+            if getattr(coro, 'cr_running', False):
+                stack = self.running_stack(coro.cr_code)
+            else:
+                stack = self.waiting_stack(coro)
+            key = ';'.join([route, *stack])
+            if key not in self.stacks and len(self.stacks) >= self.max_stacks:
+                key = f"{route};[other]"
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+    
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in list(self.stacks.items()))
+    
+    def reset(self):
+        self.stacks = {}
+        self.samples = 0
+        self.profiled_requests = 0
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "routes": sorted(self.routes),
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "in_flight": len(self.active),
+            "profiled_requests": self.profiled_requests,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "max_stacks": self.max_stacks
+        }
+
+profiler = SamplingProfiler(PROFILER_MAX_STACKS)
+
+# List endpoints return stored documents as they are: they were built from the
+# models when written, so re-validating every item on the way out is skipped
+STUDENT_PROJECTION = {"_id": 0, **{field: 1 for field in Student.model_fields}}
+BEHAVIOR_RECORD_PROJECTION = {"_id": 0, **{field: 1 for field in BehaviorRecord.model_fields}}
+
+# Listings use keyset pagination: the cursor is an opaque encoding of the sort key
+# values of the last item returned, and the next page starts right after them
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 500
+CURSOR_VALUE_TYPES = (str, int, float, bool)
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError:
+        values = None
+    # Values go into the query as they are, so anything but a scalar (such as a
+    # client-made {"$regex": ...}) would inject operators into the page filter
+    if (not isinstance(values, list) or len(values) != size
+            or not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values)):
+        raise HTTPException(status_code=400, detail="مؤشر الصفحة غير صالح")
+    return values
+
+def validate_page_size(limit: int):
+    if limit < 1 or limit > PAGE_SIZE_MAX:
+        raise HTTPException(status_code=400, detail=f"عدد العناصر في الصفحة يجب أن يكون بين 1 و {PAGE_SIZE_MAX}")
+
+def keyset_after(fields: List[str], values: list, operators: List[str]) -> dict:
+    # (a, b, c) > (x, y, z)  ==>  a > x  or  (a = x and b > y)  or  (a = x and b = y and c > z)
+    clauses = []
+    for i, field in enumerate(fields):
+        clause = {fields[j]: values[j] for j in range(i)}
+        clause[field] = {operators[i]: values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+# Date fields that older versions stored as ISO strings
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "students": ["created_at"],
+    "behavior_records": ["date", "created_at"],
+    "import_jobs": ["created_at", "finished_at"],
+}
+
+def parse_stored_date(value):
+    if not isinstance(value, str):
+        return value
+    parsed = datetime.fromisoformat(value)
+    # Naive strings were written from UTC timestamps
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+async def migrate_string_dates(batch_size: int = 1000, database=None, log=print):
+    # Converts ISO string dates to native BSON datetimes in batches of batch_size.
+    # Progress is checkpointed per collection in the migrations collection, so an
+    # interrupted run resumes after the last converted _id.
+    database = database if database is not None else db
+    for collection_name, fields in DATE_FIELDS.items():
+        checkpoint_id = f"string_dates:{collection_name}"
+        checkpoint = await database.migrations.find_one({"_id": checkpoint_id}) or {}
+        last_id = checkpoint.get('last_id')
+        converted = checkpoint.get('converted', 0)
+        
+        while True:
+            query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = await database[collection_name].find(
+                query, {field: 1 for field in fields}
+            ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            
+            updates = []
+            for doc in docs:
+                changes = {field: parse_stored_date(doc[field]) for field in fields if isinstance(doc.get(field), str)}
+                updates.append(UpdateOne({"_id": doc['_id']}, {"$set": changes}))
+            await database[collection_name].bulk_write(updates, ordered=False)
+            
+            last_id = docs[-1]['_id']
+            converted += len(docs)
+            await database.migrations.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_id": last_id, "converted": converted}},
+                upsert=True
+            )
+            log(f"{collection_name}: {converted} documents converted")
+        
+        await database.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"completed_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+# Students created before name search existed have no name_tokens. Each worker
+# indexes any that are left when it starts (index_student_names below); until it
+# has finished, searches also match them by a plain substring of their name.
+name_search_state = {"indexed": False}
+
+async def backfill_name_search_fields(batch_size: int = 1000, database=None, log=print):
+    # Writes name_normalized/name_tokens for students created before search existed
+    database = database if database is not None else db
+    updated = 0
+    last_id = None
+    while True:
+        query = {"name_tokens": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await database.students.find(query, {"name": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        
+        await database.students.bulk_write([
+            UpdateOne({"_id": doc['_id']}, {"$set": name_search_fields(doc.get('name') or '')})
+            for doc in docs
+        ], ordered=False)
+        last_id = docs[-1]['_id']
+        updated += len(docs)
+        log(f"students: {updated} names indexed for search")
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -116,6 +1197,50 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+async def insert_student_batch(batch: List[tuple]) -> tuple:
+    # batch holds (excel_row, password, user_doc, student_doc); passwords are hashed
+    # in the pool, then both collections are written with one unordered insert_many
+    # each and failures are mapped back to the Excel row
+    if not batch:
+        return 0, []
+    
+    password_hashes = await hash_passwords_async([password for _, password, _, _ in batch])
+    for (_, _, user_doc, _), password_hash in zip(batch, password_hashes):
+        user_doc['password_hash'] = password_hash
+    
+    errors = []
+    failed_users = set()
+    try:
+        await db.users.insert_many([user_doc for _, _, user_doc, _ in batch], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            failed_users.add(write_error['index'])
+            errors.append(f"خطأ في الصف {batch[write_error['index']][0]}: {write_error.get('errmsg', '')}")
+    
+    remaining = [entry for i, entry in enumerate(batch) if i not in failed_users]
+    if not remaining:
+        return 0, errors
+    
+    orphaned_user_ids = []
+    try:
+        await db.students.insert_many([student_doc for _, _, _, student_doc in remaining], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get('writeErrors', []):
+            excel_row, _, user_doc, _ = remaining[write_error['index']]
+            orphaned_user_ids.append(user_doc['id'])
+            errors.append(f"خطأ في الصف {excel_row}: {write_error.get('errmsg', '')}")
+    
+    # Don't leave user accounts behind for students that failed to insert
+    if orphaned_user_ids:
+        await db.users.delete_many({"id": {"$in": orphaned_user_ids}})
+    
+    orphaned = set(orphaned_user_ids)
+    inserted = [student_doc for _, _, user_doc, student_doc in remaining if user_doc['id'] not in orphaned]
+    leaderboard.add_students(inserted)
+    await data_versions.bump(*{student_doc['class_name'] for student_doc in inserted})
+    
+    return len(remaining) - len(orphaned_user_ids), errors
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
         token = credentials.credentials
@@ -124,9 +1249,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.put(user)
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
@@ -169,8 +1297,7 @@ async def register(user_data: UserCreate):
     )
     
     user_doc = user.model_dump()
-    user_doc['password_hash'] = hash_password(user_data.password)
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
+    user_doc['password_hash'] = await hash_password_async(user_data.password)
     
     await db.users.insert_one(user_doc)
     
@@ -185,9 +1312,10 @@ async def register(user_data: UserCreate):
             class_name=user_data.class_name or "",
             total_points=0
         )
-        student_doc = student.model_dump()
-        student_doc['created_at'] = student_doc['created_at'].isoformat()
+        student_doc = student_document(student)
         await db.students.insert_one(student_doc)
+        leaderboard.add_students([student_doc])
+        await data_versions.bump(student_doc['class_name'])
     
     return Token(access_token=access_token, token_type="bearer", user=user)
 
@@ -221,7 +1349,7 @@ async def login(credentials: UserLogin):
             raise HTTPException(status_code=401, detail="بيانات الدخول غير صحيحة")
     
     # Verify password
-    if not verify_password(credentials.password, user['password_hash']):
+    if not await verify_password_async(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="بيانات الدخول غير صحيحة")
     
     # Create access token
@@ -236,13 +1364,38 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     return User(**{k: v for k, v in current_user.items() if k != 'password_hash'})
 
 # Student Routes
-@api_router.get("/students", response_model=List[Student])
-async def get_students(current_user: dict = Depends(get_current_user)):
-    students = await db.students.find({}, {"_id": 0}).to_list(1000)
-    for student in students:
-        if isinstance(student.get('created_at'), str):
-            student['created_at'] = datetime.fromisoformat(student['created_at'])
-    return students
+@api_router.get("/students", response_model=StudentPage)
+async def get_students(
+    request: Request,
+    class_name: Optional[str] = None,
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    validate_page_size(limit)
+    
+    etag = await data_versions.etag(request, class_name or None)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    
+    # Ordered by (class_name, name, id) on the matching index
+    query = {}
+    if class_name:
+        query["class_name"] = class_name
+    if cursor:
+        query.update(keyset_after(["class_name", "name", "id"], decode_cursor(cursor, 3), ["$gt", "$gt", "$gt"]))
+    
+    students = await db.students.find(query, STUDENT_PROJECTION).sort(
+        [("class_name", 1), ("name", 1), ("id", 1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(students) > limit:
+        students = students[:limit]
+        last = students[-1]
+        next_cursor = encode_cursor([last['class_name'], last['name'], last['id']])
+    
+    return ORJSONResponse({"items": students, "next_cursor": next_cursor}, headers=etag_headers(etag))
 
 @api_router.post("/students", response_model=Student)
 async def create_student(student_data: StudentCreate, current_user: dict = Depends(get_current_user)):
@@ -269,8 +1422,7 @@ async def create_student(student_data: StudentCreate, current_user: dict = Depen
         )
         
         user_doc = user.model_dump()
-        user_doc['password_hash'] = hash_password(default_password)
-        user_doc['created_at'] = user_doc['created_at'].isoformat()
+        user_doc['password_hash'] = await hash_password_async(default_password)
         
         await db.users.insert_one(user_doc)
         user_id = user.id
@@ -283,21 +1435,100 @@ async def create_student(student_data: StudentCreate, current_user: dict = Depen
         total_points=0
     )
     
-    student_doc = student.model_dump()
-    student_doc['created_at'] = student_doc['created_at'].isoformat()
+    student_doc = student_document(student)
     
     await db.students.insert_one(student_doc)
+    leaderboard.add_students([student_doc])
+    await data_versions.bump(student_doc['class_name'])
     return student
 
+@api_router.get("/classes", response_model=List[str])
+async def get_classes(current_user: dict = Depends(get_current_user)):
+    # distinct reads the class names off the class_name_* indexes, not the students
+    classes = await db.students.distinct("class_name")
+    return sorted(class_name for class_name in classes if class_name)
+
+SEARCH_QUERY_MAX_LENGTH = 100
+SEARCH_PAGE_SIZE_DEFAULT = 20
+
+@api_router.get("/students/search", response_model=StudentPage)
+async def search_students(
+    request: Request,
+    q: str,
+    class_name: Optional[str] = None,
+    limit: int = SEARCH_PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    validate_page_size(limit)
+    
+    if len(q) > SEARCH_QUERY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail="نص البحث طويل جداً")
+    
+    normalized = normalize_arabic(q)
+    tokens = list(dict.fromkeys(normalized.split()))
+    if not tokens:
+        raise HTTPException(status_code=400, detail="يرجى إدخال نص للبحث")
+    
+    # Indexing the remaining names changes the results without a write
+    etag = await data_versions.etag(request, class_name or None, 'tokens' if name_search_state['indexed'] else 'names')
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    
+    # Every query token has to prefix a name token; anchored prefixes are read as
+    # ranges on the name_tokens index. Ranked: exact name, name prefix, whole
+    # tokens, then token prefixes; keyset paging on (rank, name, id).
+    match = {"$and": [{"name_tokens": {"$regex": f"^{re.escape(token)}"}} for token in tokens]}
+    fill_unindexed = []
+    if not name_search_state['indexed']:
+        # Students not indexed yet are matched on their stored name and ranked on it
+        unindexed = {"name_tokens": {"$exists": False}, "name": {"$regex": re.escape(' '.join(q.split()))}}
+        match = {"$or": [match, unindexed]}
+        fill_unindexed = [{"$addFields": {
+            "name_normalized": {"$ifNull": ["$name_normalized", "$name"]},
+            "name_tokens": {"$ifNull": ["$name_tokens", []]}
+        }}]
+    if class_name:
+        match["class_name"] = class_name
+    pipeline = [
+        {"$match": match},
+        *fill_unindexed,
+        {"$addFields": {"search_rank": {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$name_normalized", normalized]}, "then": 0},
+                {"case": {"$eq": [{"$substrCP": ["$name_normalized", 0, len(normalized)]}, normalized]}, "then": 1},
+                {"case": {"$setIsSubset": [tokens, "$name_tokens"]}, "then": 2}
+            ],
+            "default": 3
+        }}}}
+    ]
+    if cursor:
+        pipeline.append({"$match": keyset_after(
+            ["search_rank", "name_normalized", "id"], decode_cursor(cursor, 3), ["$gt", "$gt", "$gt"]
+        )})
+    pipeline += [
+        {"$sort": {"search_rank": 1, "name_normalized": 1, "id": 1}},
+        {"$limit": limit + 1},
+        {"$project": {**STUDENT_PROJECTION, "search_rank": 1, "name_normalized": 1}}
+    ]
+    students = await db.students.aggregate(pipeline).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(students) > limit:
+        students = students[:limit]
+        last = students[-1]
+        next_cursor = encode_cursor([last['search_rank'], last['name_normalized'], last['id']])
+    for student in students:
+        del student['search_rank'], student['name_normalized']
+    
+    return ORJSONResponse({"items": students, "next_cursor": next_cursor}, headers=etag_headers(etag))
+
 @api_router.get("/students/{student_id}", response_model=Student)
 async def get_student(student_id: str, current_user: dict = Depends(get_current_user)):
     student = await db.students.find_one({"id": student_id}, {"_id": 0})
     if not student:
         raise HTTPException(status_code=404, detail="الطالبة غير موجودة")
     
-    if isinstance(student.get('created_at'), str):
-        student['created_at'] = datetime.fromisoformat(student['created_at'])
-    
     return Student(**student)
 
 @api_router.get("/students/user/{user_id}", response_model=Student)
@@ -306,9 +1537,6 @@ async def get_student_by_user(user_id: str, current_user: dict = Depends(get_cur
     if not student:
         raise HTTPException(status_code=404, detail="الطالبة غير موجودة")
     
-    if isinstance(student.get('created_at'), str):
-        student['created_at'] = datetime.fromisoformat(student['created_at'])
-    
     return Student(**student)
 
 # Behavior Routes
@@ -329,65 +1557,202 @@ async def create_behavior_record(record_data: BehaviorRecordCreate, current_user
     )
     
     record_doc = record.model_dump()
-    record_doc['date'] = record_doc['date'].isoformat()
-    record_doc['created_at'] = record_doc['created_at'].isoformat()
     
-    await db.behavior_records.insert_one(record_doc)
+    # Update student's total points atomically, this also checks the student exists
+    points_change = points_delta(record.behavior_type, record.points)
+    student = await db.students.find_one_and_update(
+        {"id": record_data.student_id},
+        {"$inc": {"total_points": points_change}},
+        projection=EVENT_STUDENT_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if student is None:
+        raise HTTPException(status_code=404, detail="الطالبة غير موجودة")
     
-    # Update student's total points
-    student = await db.students.find_one({"id": record_data.student_id})
-    if student:
-        points_change = record_data.points if record_data.behavior_type == "positive" else -record_data.points
-        new_total = student.get('total_points', 0) + points_change
+    try:
+        await db.behavior_records.insert_one(record_doc)
+    except Exception:
+        # Keep the total consistent with the stored records
         await db.students.update_one(
             {"id": record_data.student_id},
-            {"$set": {"total_points": new_total}}
+            {"$inc": {"total_points": -points_change}}
         )
+        raise
+    
+    await apply_rollup_updates([record_doc])
+    leaderboard.adjust_points(record.student_id, points_change)
+    await data_versions.bump(student['class_name'])
+    publish_behavior_event("behavior_created", student, record_doc, points_change)
     
     return record
 
-@api_router.get("/behavior/student/{student_id}", response_model=List[BehaviorRecord])
-async def get_student_behavior(student_id: str, current_user: dict = Depends(get_current_user)):
-    records = await db.behavior_records.find({"student_id": student_id}, {"_id": 0}).sort("date", -1).to_list(1000)
+@api_router.post("/behavior/bulk", response_model=List[BulkBehaviorResult])
+async def create_bulk_behavior_records(bulk_data: BulkBehaviorCreate, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] not in ['admin', 'teacher']:
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    if bulk_data.points < 1 or bulk_data.points > 10:
+        raise HTTPException(status_code=400, detail="النقاط يجب أن تكون بين 1 و 10")
     
-    for record in records:
-        if isinstance(record.get('date'), str):
-            record['date'] = datetime.fromisoformat(record['date'])
-        if isinstance(record.get('created_at'), str):
-            record['created_at'] = datetime.fromisoformat(record['created_at'])
+    if not bulk_data.student_ids and not bulk_data.class_name:
+        raise HTTPException(status_code=400, detail="يجب تحديد الطالبات أو الصف")
     
-    return records
+    # Resolve the target students with a single query
+    if bulk_data.student_ids:
+        requested_ids = list(dict.fromkeys(bulk_data.student_ids))
+        students = await db.students.find({"id": {"$in": requested_ids}}, {"_id": 0, "id": 1, "class_name": 1}).to_list(None)
+    else:
+        students = await db.students.find({"class_name": bulk_data.class_name}, {"_id": 0, "id": 1, "class_name": 1}).to_list(None)
+        requested_ids = [s['id'] for s in students]
+    class_names = {s['id']: s['class_name'] for s in students}
+    
+    results = {}
+    records = []
+    for student_id in requested_ids:
+        if student_id not in class_names:
+            results[student_id] = BulkBehaviorResult(student_id=student_id, success=False, error="الطالبة غير موجودة")
+            continue
+        records.append(BehaviorRecord(
+            student_id=student_id,
+            teacher_id=current_user['id'],
+            behavior_type=bulk_data.behavior_type,
+            points=bulk_data.points,
+            description=bulk_data.description
+        ))
+    
+    if records:
+        record_docs = [record.model_dump() for record in records]
+        
+        # Insert all records at once, then only award points for the ones that were stored
+        failed = {}
+        try:
+            await db.behavior_records.insert_many(record_docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed[write_error['index']] = write_error.get('errmsg', '')
+        
+        points_change = points_delta(bulk_data.behavior_type, bulk_data.points)
+        updates = []
+        stored_docs = []
+        for i, record in enumerate(records):
+            if i in failed:
+                results[record.student_id] = BulkBehaviorResult(student_id=record.student_id, success=False, error=failed[i])
+                continue
+            updates.append(UpdateOne({"id": record.student_id}, {"$inc": {"total_points": points_change}}))
+            stored_docs.append(record_docs[i])
+            results[record.student_id] = BulkBehaviorResult(student_id=record.student_id, success=True, record_id=record.id)
+        
+        if updates:
+            await db.students.bulk_write(updates, ordered=False)
+            await apply_rollup_updates(stored_docs)
+            for record_doc in stored_docs:
+                leaderboard.adjust_points(record_doc['student_id'], points_change)
+            await data_versions.bump(*{class_names[record_doc['student_id']] for record_doc in stored_docs})
+            
+            # Totals are only read back when someone is listening for them
+            if event_broker.has_subscribers():
+                stored_ids = [record_doc['student_id'] for record_doc in stored_docs]
+                updated = await db.students.find({"id": {"$in": stored_ids}}, EVENT_STUDENT_PROJECTION).to_list(None)
+                updated_by_id = {student['id']: student for student in updated}
+                for record_doc in stored_docs:
+                    student = updated_by_id.get(record_doc['student_id'])
+                    if student is not None:
+                        publish_behavior_event("behavior_created", student, record_doc, points_change)
+    
+    return [results[student_id] for student_id in requested_ids]
 
-# Statistics Route
-@api_router.get("/statistics", response_model=Statistics)
-async def get_statistics(current_user: dict = Depends(get_current_user)):
-    if current_user['role'] != 'admin':
-        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+@api_router.get("/behavior/student/{student_id}", response_model=BehaviorRecordPage)
+async def get_student_behavior(
+    student_id: str,
+    limit: int = PAGE_SIZE_DEFAULT,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    validate_page_size(limit)
     
-    # Total students
-    total_students = await db.students.count_documents({})
+    # Newest first, ordered by (date, id) on the (student_id, date, id) index. Until
+    # `manage.py migrate-dates` has run some dates are ISO strings, which MongoDB
+    # sorts after every native date in this order, so the cursor records which
+    # kind of date the page ended on.
+    query = {"student_id": student_id}
+    if cursor:
+        last_date, last_id, last_is_string = decode_cursor(cursor, 3)
+        if not last_is_string:
+            try:
+                last_date = datetime.fromisoformat(last_date)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="مؤشر الصفحة غير صالح")
+        after = keyset_after(["date", "id"], [last_date, last_id], ["$lt", "$lt"])
+        if not last_is_string:
+            after["$or"].append({"date": {"$type": "string"}})
+        query.update(after)
     
-    # Total positive/negative records
-    total_positive = await db.behavior_records.count_documents({"behavior_type": "positive"})
-    total_negative = await db.behavior_records.count_documents({"behavior_type": "negative"})
+    records = await db.behavior_records.find(query, BEHAVIOR_RECORD_PROJECTION).sort(
+        [("date", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
     
-    # Top students
-    top_students_cursor = db.students.find({}, {"_id": 0}).sort("total_points", -1).limit(5)
-    top_students = await top_students_cursor.to_list(5)
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        last_date = records[-1]['date']
+        last_is_string = isinstance(last_date, str)
+        next_cursor = encode_cursor([last_date if last_is_string else last_date.isoformat(), records[-1]['id'], last_is_string])
     
-    # Recent activities
-    recent_cursor = db.behavior_records.find({}, {"_id": 0}).sort("date", -1).limit(10)
-    recent_activities = await recent_cursor.to_list(10)
+    return ORJSONResponse({"items": records, "next_cursor": next_cursor})
+
+async def top_students_overall(n: int, version: int) -> List[dict]:
+    if await leaderboard.ensure_loaded() and leaderboard.is_current(version):
+        return leaderboard.top_overall(n)
+    return await db.students.find({}, STUDENT_PROJECTION).sort("total_points", -1).limit(n).to_list(n)
+
+async def compute_statistics(version: int) -> Statistics:
+    # The parts run concurrently. The student count comes from the collection
+    # metadata, the top five from the total_points index (or the leaderboard
+    # cache) and the recent activities from the date index. The record counts are
+    # COUNT_SCANs on behavior_type: no documents are fetched, but every matching
+    # index key is read, so they grow with the number of records. That is why the
+    # result is cached per data version rather than computed per request.
+    total_students, positive_count, negative_count, top_students, recent_activities = await asyncio.gather(
+        db.students.estimated_document_count(),
+        db.behavior_records.count_documents({"behavior_type": "positive"}),
+        db.behavior_records.count_documents({"behavior_type": "negative"}),
+        top_students_overall(5, version),
+        db.behavior_records.find({}, {"_id": 0}).sort("date", -1).limit(10).to_list(10)
+    )
     
     return Statistics(
         total_students=total_students,
-        total_positive_records=total_positive,
-        total_negative_records=total_negative,
+        total_positive_records=positive_count,
+        total_negative_records=negative_count,
         top_students=top_students,
         recent_activities=recent_activities
     )
 
-@api_router.post("/students/import", response_model=dict)
+@api_router.get("/behavior/student/{student_id}/summary", response_model=BehaviorSummary)
+async def get_student_behavior_summary(student_id: str, current_user: dict = Depends(get_current_user)):
+    # Totals over every record of the student, so pages of the history can load on demand
+    totals = await db.behavior_records.aggregate([
+        {"$match": {"student_id": student_id}},
+        {"$group": {"_id": None, **behavior_totals()}}
+    ]).to_list(1)
+    return BehaviorSummary(**totals[0]) if totals else BehaviorSummary()
+
+# Statistics Route
+@api_router.get("/statistics", response_model=Statistics)
+async def get_statistics(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    async with statistics_lock:
+        version = await data_versions.current()
+        cached = statistics_cache['value']
+        if (cached is None or statistics_cache['version'] != version
+                or time.monotonic() >= statistics_cache['expires_at']):
+            cached = await compute_statistics(version)
+            statistics_cache.update(value=cached, version=version, expires_at=time.monotonic() + STATISTICS_CACHE_SECONDS)
+    return cached
+
+@api_router.post("/students/import", response_model=ImportJob, status_code=202)
 async def import_students(
     file: UploadFile = File(...), 
     class_name: Optional[str] = None,
@@ -399,141 +1764,235 @@ async def import_students(
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="يجب أن يكون الملف من نوع Excel (.xlsx أو .xls)")
     
+    # class_name must be provided as parameter
+    if not class_name:
+        raise HTTPException(
+            status_code=400, 
+            detail="يجب تحديد الصف والفصل من القائمة قبل رفع الملف"
+        )
+    
+    if import_queue.full():
+        raise HTTPException(status_code=503, detail="يوجد عدد كبير من عمليات الاستيراد قيد التنفيذ، يرجى المحاولة لاحقاً")
+    
+    # Spool the upload to disk instead of holding it in memory until a worker is free
+    suffix = '.xls' if file.filename.endswith('.xls') else '.xlsx'
+    spool = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=IMPORT_SPOOL_DIR)
+    try:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, spool, 1024 * 1024)
+    finally:
+        spool.close()
+    
+    job = ImportJob(
+        filename=file.filename,
+        class_name=class_name,
+        created_by=current_user['id']
+    )
+    job_doc = job.model_dump()
+    await db.import_jobs.insert_one(job_doc)
+    
+    try:
+        import_queue.put_nowait((job.id, spool.name, class_name))
+    except asyncio.QueueFull:
+        # Other uploads filled the queue while this one was being spooled
+        remove_spool(spool.name)
+        await db.import_jobs.delete_one({"id": job.id})
+        raise HTTPException(status_code=503, detail="يوجد عدد كبير من عمليات الاستيراد قيد التنفيذ، يرجى المحاولة لاحقاً")
+    pending_import_jobs[job.id] = spool.name
+    return job
+
+@api_router.get("/import-jobs/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] not in ['admin', 'teacher']:
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    job = await db.import_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="عملية الاستيراد غير موجودة")
+    
+    return ImportJob(**job)
+
+async def run_import_job(job_id: str, path: str, class_name: Optional[str]):
+    await db.import_jobs.update_one({"id": job_id}, {"$set": {"status": "running"}})
+    
+    # Parsing is blocking, keep it off the event loop
+    columns, rows, close_roster = await asyncio.to_thread(open_roster, path)
     try:
-        # Read Excel file
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
-        
         # Validate required columns
-        if 'الاسم' not in df.columns:
-            raise HTTPException(
-                status_code=400, 
-                detail="الملف يجب أن يحتوي على عمود 'الاسم' فقط"
-            )
-        
-        # class_name must be provided as parameter
-        if not class_name:
-            raise HTTPException(
-                status_code=400, 
-                detail="يجب تحديد الصف والفصل من القائمة قبل رفع الملف"
-            )
+        if 'الاسم' not in columns:
+            raise ValueError("الملف يجب أن يحتوي على عمود 'الاسم' فقط")
         
+        rows_processed = 0
         added_count = 0
         skipped_count = 0
-        errors = []
         default_password_used = False
+        excel_row = 1  # header row
         
-        for index, row in df.iterrows():
-            try:
-                name = str(row['الاسم']).strip()
-                
-                # Skip empty rows
-                if not name or name == 'nan':
-                    skipped_count += 1
-                    continue
-                
-                # Get class_name: either from parameter or from Excel
-                student_class_name = class_name  # Use parameter if provided
-                
-                if not student_class_name:
-                    # If not provided as parameter, get from Excel
-                    student_class_name = str(row['الصف']).strip() if 'الصف' in row and pd.notna(row['الصف']) else None
+        while True:
+            # Pull the next fixed-size chunk of rows from the sheet
+            chunk = await asyncio.to_thread(list, islice(rows, IMPORT_BATCH_SIZE))
+            if not chunk:
+                break
+            
+            batch = []
+            errors = []
+            for row in chunk:
+                excel_row += 1
+                rows_processed += 1
+                try:
+                    name = cell_text(row.get('الاسم'))
                     
-                    if not student_class_name or student_class_name == 'nan':
-                        errors.append(f"الصف {index + 2}: الطالبة {name} - الصف والفصل مفقودان")
+                    # Skip empty rows
+                    if not name:
                         skipped_count += 1
                         continue
-                
-                # Validate class_name format (should be like "1/أ")
-                if '/' not in student_class_name:
-                    errors.append(f"الصف {index + 2}: الطالبة {name} - تنسيق الصف غير صحيح (يجب أن يكون مثل: 1/أ)")
+                    
+                    # Get class_name: either from parameter or from Excel
+                    student_class_name = class_name  # Use parameter if provided
+                    
+                    if not student_class_name:
+                        # If not provided as parameter, get from Excel
+                        student_class_name = cell_text(row.get('الصف'))
+                        
+                        if not student_class_name:
+                            errors.append(f"الصف {excel_row}: الطالبة {name} - الصف والفصل مفقودان")
+                            skipped_count += 1
+                            continue
+                    
+                    # Validate class_name format (should be like "1/أ")
+                    if '/' not in student_class_name:
+                        errors.append(f"الصف {excel_row}: الطالبة {name} - تنسيق الصف غير صحيح (يجب أن يكون مثل: 1/أ)")
+                        skipped_count += 1
+                        continue
+                    
+                    # Get password from Excel or use default
+                    password = cell_text(row.get('كلمة المرور'))
+                    if not password:
+                        password = "123456"  # Default password
+                        default_password_used = True
+                    
+                    # Create unique email for student with UUID to avoid duplicates
+                    safe_name = name.replace(" ", "_").lower()
+                    safe_class = student_class_name.replace("/", "_")
+                    unique_id = str(uuid.uuid4())[:8]
+                    email = f"{safe_name}_{safe_class}_{unique_id}@tamayyuz.local"
+                    
+                    # Build user
+                    user = User(
+                        name=name,
+                        email=email,
+                        role="student"
+                    )
+                    
+                    user_doc = user.model_dump()
+                    
+                    # Build student record
+                    student = Student(
+                        user_id=user.id,
+                        name=name,
+                        class_name=student_class_name,
+                        total_points=0
+                    )
+                    student_doc = student_document(student)
+                    
+                    batch.append((excel_row, password, user_doc, student_doc))
+                    
+                except Exception as e:
+                    errors.append(f"خطأ في الصف {excel_row}: {str(e)}")
                     skipped_count += 1
-                    continue
-                
-                # Get password from Excel or use default
-                if 'كلمة المرور' in df.columns and pd.notna(row.get('كلمة المرور')):
-                    password = str(row['كلمة المرور']).strip()
-                else:
-                    password = "123456"  # Default password
-                    default_password_used = True
-                
-                # Create unique email for student with UUID to avoid duplicates
-                safe_name = name.replace(" ", "_").lower()
-                safe_class = student_class_name.replace("/", "_")
-                unique_id = str(uuid.uuid4())[:8]
-                email = f"{safe_name}_{safe_class}_{unique_id}@tamayyuz.local"
-                
-                # Create user
-                user = User(
-                    name=name,
-                    email=email,
-                    role="student"
-                )
-                
-                user_doc = user.model_dump()
-                user_doc['password_hash'] = hash_password(password)
-                user_doc['created_at'] = user_doc['created_at'].isoformat()
-                
-                await db.users.insert_one(user_doc)
-                
-                # Create student record
-                student = Student(
-                    user_id=user.id,
-                    name=name,
-                    class_name=student_class_name,
-                    total_points=0
-                )
-                student_doc = student.model_dump()
-                student_doc['created_at'] = student_doc['created_at'].isoformat()
-                await db.students.insert_one(student_doc)
-                
-                added_count += 1
-                
-            except Exception as e:
-                errors.append(f"خطأ في الصف {index + 2}: {str(e)}")
-                skipped_count += 1
-        
-        # Prepare success message
-        message = f"تم استيراد {added_count} طالبة بنجاح"
-        if class_name:
-            message += f" إلى الصف {class_name}"
-        if default_password_used:
-            message += " | كلمة المرور الافتراضية: 123456"
-        
-        return {
-            "success": True,
-            "added_count": added_count,
-            "skipped_count": skipped_count,
+            
+            # Write the chunk with bulk inserts
+            batch_added, batch_errors = await insert_student_batch(batch)
+            added_count += batch_added
+            skipped_count += len(batch) - batch_added
+            errors.extend(batch_errors)
+            
+            # Publish progress once per chunk
+            await db.import_jobs.update_one(
+                {"id": job_id},
+                {
+                    "$set": {
+                        "rows_processed": rows_processed,
+                        "added_count": added_count,
+                        "skipped_count": skipped_count
+                    },
+                    "$push": {"errors": {"$each": errors}}
+                }
+            )
+    finally:
+        await asyncio.to_thread(close_roster)
+    
+    # Prepare success message
+    message = f"تم استيراد {added_count} طالبة بنجاح"
+    if class_name:
+        message += f" إلى الصف {class_name}"
+    if default_password_used:
+        message += " | كلمة المرور الافتراضية: 123456"
+    
+    await db.import_jobs.update_one(
+        {"id": job_id},
+        {"$set": {
+            "status": "completed",
             "message": message,
-            "class_name": class_name,
-            "errors": errors if errors else []
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"فشل قراءة الملف: {str(e)}")
+            "finished_at": datetime.now(timezone.utc)
+        }}
+    )
+
+def interrupted_import_message(job: dict) -> str:
+    added_count = job.get('added_count', 0)
+    if not added_count:
+        return "توقفت عملية الاستيراد بسبب إعادة تشغيل الخادم، يرجى رفع الملف مرة أخرى"
+    # Rows are written chunk by chunk, so re-uploading the whole file would add these students twice
+    return (
+        f"توقفت عملية الاستيراد بسبب إعادة تشغيل الخادم بعد إضافة {added_count} طالبة على الأقل "
+        f"من أول {job.get('rows_processed', 0)} صفاً في الملف. "
+        "يرجى مراجعة قائمة الصف ورفع الصفوف المتبقية فقط لتجنب تكرار الطالبات"
+    )
+
+async def import_worker():
+    while True:
+        job_id, path, class_name = await import_queue.get()
+        try:
+            await run_import_job(job_id, path, class_name)
+        except Exception as e:
+            logger.exception("Import job %s failed", job_id)
+            await db.import_jobs.update_one(
+                {"id": job_id},
+                {"$set": {
+                    "status": "failed",
+                    "message": f"فشل قراءة الملف: {str(e)}",
+                    "finished_at": datetime.now(timezone.utc)
+                }}
+            )
+        finally:
+            remove_spool(path)
+            import_queue.task_done()
+        # Not reached when the worker is cancelled, so stop_import_workers still
+        # sees the interrupted job and marks it as failed
+        pending_import_jobs.pop(job_id, None)
 
 @api_router.delete("/behavior/{behavior_id}")
 async def delete_behavior(behavior_id: str, current_user: dict = Depends(get_current_user)):
     if current_user['role'] not in ['admin', 'teacher']:
         raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
     
-    # Get behavior record
-    behavior = await db.behavior_records.find_one({"id": behavior_id}, {"_id": 0})
+    # Delete behavior record, only one of several concurrent deletes gets it back
+    behavior = await db.behavior_records.find_one_and_delete({"id": behavior_id}, {"_id": 0})
     if not behavior:
         raise HTTPException(status_code=404, detail="السجل غير موجود")
     
     # Update student's total points (reverse the behavior)
-    student = await db.students.find_one({"id": behavior['student_id']})
-    if student:
-        points_change = -behavior['points'] if behavior['behavior_type'] == "positive" else behavior['points']
-        new_total = student.get('total_points', 0) + points_change
-        await db.students.update_one(
-            {"id": behavior['student_id']},
-            {"$set": {"total_points": new_total}}
-        )
-    
-    # Delete behavior record
-    await db.behavior_records.delete_one({"id": behavior_id})
+    points_change = -points_delta(behavior['behavior_type'], behavior['points'])
+    student = await db.students.find_one_and_update(
+        {"id": behavior['student_id']},
+        {"$inc": {"total_points": points_change}},
+        projection=EVENT_STUDENT_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    await apply_rollup_updates([behavior], sign=-1)
+    leaderboard.adjust_points(behavior['student_id'], points_change)
+    if student is not None:
+        await data_versions.bump(student['class_name'])
+        publish_behavior_event("behavior_deleted", student, behavior, points_change)
     
     return {"success": True, "message": "تم حذف السجل بنجاح"}
 
@@ -549,102 +2008,173 @@ async def delete_student(student_id: str, current_user: dict = Depends(get_curre
     
     # Delete student's behavior records
     await db.behavior_records.delete_many({"student_id": student_id})
+    await db.behavior_daily_rollups.delete_many({"student_id": student_id})
     
     # Delete student record
     await db.students.delete_one({"id": student_id})
+    leaderboard.remove_student(student_id)
+    await data_versions.bump(student['class_name'])
     
     # Delete user account if exists
     if student.get('user_id'):
         await db.users.delete_one({"id": student['user_id']})
+        user_cache.invalidate(student['user_id'])
     
     return {"success": True, "message": "تم حذف الطالبة بنجاح"}
 
 @api_router.get("/students/top/by-class")
-async def get_top_students_by_class(current_user: dict = Depends(get_current_user)):
-    # Get all students
-    students = await db.students.find({}, {"_id": 0}).to_list(10000)
+async def get_top_students_by_class(
+    request: Request,
+    response: Response,
+    n: int = 5,
+    current_user: dict = Depends(get_current_user)
+):
+    if n < 1 or n > 50:
+        raise HTTPException(status_code=400, detail="عدد الطالبات يجب أن يكون بين 1 و 50")
     
-    # Group by class
-    classes_dict = {}
-    for student in students:
-        class_name = student.get('class_name', '')
-        if class_name not in classes_dict:
-            classes_dict[class_name] = []
-        classes_dict[class_name].append(student)
+    version = await data_versions.current()
+    etag = data_versions.tag(request, version)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
     
-    # Get top 5 for each class
-    result = {}
-    for class_name, class_students in classes_dict.items():
-        # Sort by total_points descending
-        sorted_students = sorted(class_students, key=lambda x: x.get('total_points', 0), reverse=True)
-        result[class_name] = sorted_students[:5]
+    # The cache answers only while it holds every write behind this ETag
+    if await leaderboard.ensure_loaded() and leaderboard.is_current(version):
+        return leaderboard.top_by_class(n)
     
-    return result
+    # Walk the distinct class names on the (class_name, total_points) index, then
+    # read only the first n entries of each class from the same index, so the cost
+    # follows the number of classes rather than the number of students
+    pipeline = [
+        {"$sort": {"class_name": 1}},
+        {"$group": {"_id": "$class_name"}},
+        {"$lookup": {
+            "from": "students",
+            "localField": "_id",
+            "foreignField": "class_name",
+            "pipeline": [
+                {"$sort": {"total_points": -1}},
+                {"$limit": n},
+                {"$project": STUDENT_PROJECTION}
+            ],
+            "as": "students"
+        }}
+    ]
+    classes = await db.students.aggregate(pipeline).to_list(None)
+    
+    return {c['_id']: c['students'] for c in classes}
 
-@api_router.get("/reports/{report_type}")
-async def get_report(
-    report_type: str,
-    class_name: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
+@api_router.post("/students/top/rebuild")
+async def rebuild_leaderboard(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    async with leaderboard.lock:
+        await leaderboard.rebuild()
+    
+    return {
+        "success": True,
+        "enabled": leaderboard.enabled,
+        "students": len(leaderboard.students),
+        "classes": len(leaderboard.rankings)
+    }
+
+def first_behavior_total(field: str) -> dict:
+    return {"$ifNull": [{"$arrayElemAt": [f"$behaviors.{field}", 0]}, 0]}
+
+def rollup_total(field: str) -> dict:
+    return {"$sum": {"$add": [{"$ifNull": [f"${field}", 0]}, {"$ifNull": [f"$backfill_{field}", 0]}]}}
+
+def build_report_pipeline(students_query: dict, start_date: datetime, use_rollups: bool = True) -> List[dict]:
+    # Sum each student's daily rollups in the database: the lookup reads at most
+    # one small document per day from the (student_id, day) index, so the cost is
+    # linear in students and nothing is truncated or rescanned in Python. Before
+    # the rollups are backfilled the same lookup reads the student's records.
+    if use_rollups:
+        behaviors_lookup = {
+            "from": "behavior_daily_rollups",
+            "pipeline": [
+                {"$match": {"day": {"$gte": start_date.date().isoformat()}}},
+                {"$group": {"_id": None, **{field: rollup_total(field) for field in ROLLUP_FIELDS}}}
+            ]
+        }
+    else:
+        behaviors_lookup = {
+            "from": "behavior_records",
+            "pipeline": [
+                # Dates still stored as ISO strings only compare with a string bound; like
+                # rollup_day, they are counted by the day they start with
+                {"$match": {"$or": [{"date": {"$gte": start_date}}, {"date": {"$gte": start_date.date().isoformat()}}]}},
+                {"$group": {"_id": None, **behavior_totals()}}
+            ]
+        }
+    return [
+        {"$match": students_query},
+        {"$sort": {"total_points": -1}},
+        {"$lookup": {
+            **behaviors_lookup,
+            "localField": "id",
+            "foreignField": "student_id",
+            "as": "behaviors"
+        }},
+        {"$project": {
+            "_id": 0,
+            "student_id": "$id",
+            "student_name": "$name",
+            "class_name": "$class_name",
+            "total_points": {"$ifNull": ["$total_points", 0]},
+            "positive_count": first_behavior_total("positive_count"),
+            "negative_count": first_behavior_total("negative_count"),
+            "positive_points": first_behavior_total("positive_points"),
+            "negative_points": first_behavior_total("negative_points")
+        }},
+        {"$addFields": {
+            "net_points": {"$subtract": ["$positive_points", "$negative_points"]},
+            "total_behaviors": {"$add": ["$positive_count", "$negative_count"]}
+        }}
+    ]
+
+def report_window(report_type: str, current_user: dict):
     if current_user['role'] not in ['admin', 'teacher']:
         raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
     
     if report_type not in ['weekly', 'monthly']:
         raise HTTPException(status_code=400, detail="نوع التقرير يجب أن يكون weekly أو monthly")
     
-    # Calculate date range
+    # Reports cover whole UTC days, today included: the rollups are kept per day,
+    # so starting at midnight makes them and the raw records count the same window
     now = datetime.now(timezone.utc)
     if report_type == 'weekly':
-        start_date = now - timedelta(days=7)
+        days = 7
     else:  # monthly
-        start_date = now - timedelta(days=30)
+        days = 30
+    start_date = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    return start_date, now
+
+@api_router.get("/reports/{report_type}")
+async def get_report(
+    request: Request,
+    response: Response,
+    report_type: str,
+    class_name: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    start_date, now = report_window(report_type, current_user)
     
-    # Build query
-    query = {"date": {"$gte": start_date.isoformat()}}
+    # The window moves by whole days, so the report only changes with the data or the date
+    use_rollups = await reports_use_rollups()
+    etag = await data_versions.etag(request, class_name or None, now.date().isoformat(), 'rollups' if use_rollups else 'records')
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    response.headers.update(etag_headers(etag))
     
     # Get students filter
     students_query = {}
     if class_name:
         students_query["class_name"] = class_name
     
-    students = await db.students.find(students_query, {"_id": 0}).to_list(10000)
-    student_ids = [s['id'] for s in students]
-    
-    if student_ids:
-        query["student_id"] = {"$in": student_ids}
-    
-    # Get behavior records
-    behaviors = await db.behavior_records.find(query, {"_id": 0}).to_list(10000)
-    
-    # Calculate statistics
-    report_data = []
-    for student in students:
-        student_behaviors = [b for b in behaviors if b['student_id'] == student['id']]
-        
-        positive_behaviors = [b for b in student_behaviors if b['behavior_type'] == 'positive']
-        negative_behaviors = [b for b in student_behaviors if b['behavior_type'] == 'negative']
-        
-        positive_count = len(positive_behaviors)
-        negative_count = len(negative_behaviors)
-        positive_points = sum(b['points'] for b in positive_behaviors)
-        negative_points = sum(b['points'] for b in negative_behaviors)
-        
-        report_data.append({
-            "student_id": student['id'],
-            "student_name": student['name'],
-            "class_name": student['class_name'],
-            "total_points": student.get('total_points', 0),
-            "positive_count": positive_count,
-            "negative_count": negative_count,
-            "positive_points": positive_points,
-            "negative_points": negative_points,
-            "net_points": positive_points - negative_points,
-            "total_behaviors": positive_count + negative_count
-        })
-    
-    # Sort by total_points descending
-    report_data.sort(key=lambda x: x['total_points'], reverse=True)
+    pipeline = build_report_pipeline(students_query, start_date, use_rollups)
+    report_data = await db.students.aggregate(pipeline, allowDiskUse=True).to_list(None)
     
     return {
         "report_type": report_type,
@@ -655,10 +2185,376 @@ async def get_report(
         "data": report_data
     }
 
+# Export columns, in the same order and with the same headings as the reports page
+REPORT_EXPORT_COLUMNS = [
+    ("الترتيب", None),
+    ("اسم الطالبة", "student_name"),
+    ("الصف", "class_name"),
+    ("إجمالي النقاط", "total_points"),
+    ("السلوكيات الإيجابية", "positive_count"),
+    ("نقاط إيجابية", "positive_points"),
+    ("السلوكيات السلبية", "negative_count"),
+    ("نقاط سلبية", "negative_points"),
+    ("صافي النقاط", "net_points"),
+    ("إجمالي السلوكيات", "total_behaviors"),
+]
+REPORT_EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+async def report_row_batches(pipeline: List[dict]):
+    # Rows leave the aggregation cursor one batch at a time, so at most
+    # EXPORT_BATCH_SIZE report rows are held in memory however big the school is
+    cursor = db.students.aggregate(pipeline, allowDiskUse=True, batchSize=EXPORT_BATCH_SIZE)
+    rank = 0
+    batch = []
+    async for row in cursor:
+        rank += 1
+        batch.append([rank if field is None else row.get(field) for _, field in REPORT_EXPORT_COLUMNS])
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def csv_chunk(rows: List[list]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+async def stream_report_csv(pipeline: List[dict]):
+    # The BOM lets Excel detect UTF-8 so Arabic names open correctly
+    yield '\ufeff'.encode('utf-8') + csv_chunk([[title for title, _ in REPORT_EXPORT_COLUMNS]])
+    async for batch in report_row_batches(pipeline):
+        yield csv_chunk(batch)
+
+def new_report_workbook():
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('التقرير')
+    sheet.sheet_view.rightToLeft = True
+    sheet.append([title for title, _ in REPORT_EXPORT_COLUMNS])
+    return workbook, sheet
+
+async def stream_report_xlsx(pipeline: List[dict]):
+    # A write-only workbook keeps every appended row in a temporary file rather
+    # than in memory; the finished archive is then sent from disk in chunks
+    workbook, sheet = await asyncio.to_thread(new_report_workbook)
+    
+    def append_rows(rows: List[list]):
+        for row in rows:
+            sheet.append(row)
+    
+    with tempfile.TemporaryFile(dir=IMPORT_SPOOL_DIR) as output:
+        async for batch in report_row_batches(pipeline):
+            await asyncio.to_thread(append_rows, batch)
+        await asyncio.to_thread(workbook.save, output)
+        await asyncio.to_thread(output.seek, 0)
+        while chunk := await asyncio.to_thread(output.read, 64 * 1024):
+            yield chunk
+
+@api_router.get("/reports/{report_type}/export")
+async def export_report(
+    request: Request,
+    report_type: str,
+    format: str = 'csv',
+    class_name: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    start_date, now = report_window(report_type, current_user)
+    
+    if format not in REPORT_EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="صيغة التصدير يجب أن تكون csv أو xlsx")
+    
+    use_rollups = await reports_use_rollups()
+    etag = await data_versions.etag(request, class_name or None, now.date().isoformat(), 'rollups' if use_rollups else 'records')
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+    
+    students_query = {}
+    if class_name:
+        students_query["class_name"] = class_name
+    
+    pipeline = build_report_pipeline(students_query, start_date, use_rollups)
+    stream = stream_report_csv(pipeline) if format == 'csv' else stream_report_xlsx(pipeline)
+    
+    class_text = class_name.replace('/', '_') if class_name else 'all'
+    filename = f"report_{report_type}_{class_text}_{now.date().isoformat()}.{format}"
+    ascii_filename = f"report_{report_type}_{now.date().isoformat()}.{format}"
+    return StreamingResponse(
+        stream,
+        media_type=REPORT_EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{quote(filename, safe='')}",
+            **etag_headers(etag)
+        }
+    )
+
+@api_router.get("/metrics")
+async def get_metrics(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not (METRICS_TOKEN and hmac.compare_digest(credentials.credentials, METRICS_TOKEN)):
+        current_user = await get_current_user(credentials)
+        if current_user['role'] != 'admin':
+            raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@api_router.get("/system/password-pool")
+async def get_password_pool_stats(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    return {
+        "workers": PASSWORD_POOL_WORKERS,
+        "max_queue": PASSWORD_POOL_MAX_QUEUE,
+        "reserved": PASSWORD_POOL_RESERVED,
+        "bulk_chunk_size": PASSWORD_BULK_CHUNK_SIZE,
+        **password_pool_stats
+    }
+
+async def stream_events(class_name: Optional[str]):
+    queue = event_broker.subscribe(class_name)
+    deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+    try:
+        # Ask EventSource-style clients to reconnect quickly once the stream ends
+        yield b"retry: 3000\n\n"
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                yield await asyncio.wait_for(queue.get(), min(EVENTS_KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        event_broker.unsubscribe(class_name, queue)
+
+@api_router.get("/events")
+async def get_events(class_name: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] not in ['admin', 'teacher']:
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    if event_broker.is_full():
+        raise HTTPException(status_code=503, detail="عدد المتصلين كبير، يرجى المحاولة لاحقاً")
+    
+    # Streams end after EVENTS_MAX_STREAM_SECONDS so restarts and deploys are
+    # never held up by open connections; clients reconnect and resync
+    return StreamingResponse(
+        stream_events(class_name),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/system/events")
+async def get_event_stats(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    return event_broker.stats()
+
+@api_router.get("/system/profiler")
+async def get_profiler(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    return profiler.stats()
+
+@api_router.put("/system/profiler")
+async def configure_profiler(settings: ProfilerSettings, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    if not 0 < settings.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="نسبة العينات يجب أن تكون أكبر من 0 ولا تتجاوز 1")
+    
+    if not 1 <= settings.interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="الفاصل الزمني يجب أن يكون بين 1 و 1000 مللي ثانية")
+    
+    profiler.configure(settings)
+    return profiler.stats()
+
+@api_router.get("/system/profiler/stacks")
+async def download_profile(reset: bool = False, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    collapsed = profiler.collapsed()
+    if reset:
+        profiler.reset()
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.collapsed"'}
+    )
+
+@api_router.get("/system/user-cache")
+async def get_user_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="غير مصرح لك بهذا الإجراء")
+    
+    return user_cache.stats()
+
 @api_router.get("/")
 async def root():
     return {"message": "مرحباً بك في منصة رواد التميز"}
 
+# Compression: br is preferred over gzip when the client accepts both. Responses
+# smaller than minimum_size go out as they are; streamed responses are compressed
+# chunk by chunk and flushed so clients still receive every chunk as it is sent.
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        params = params.strip()
+        try:
+            weights[coding.strip().lower()] = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            weights[coding.strip().lower()] = 0.0
+    
+    def weight(encoding):
+        return weights.get(encoding, weights.get('*', 0.0))
+    
+    candidates = [encoding for encoding in ('br', 'gzip') if weight(encoding) > 0]
+    return max(candidates, key=weight, default=None)
+
+class StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == 'br':
+            return self.compressor.process(data) + (self.compressor.finish() if final else self.compressor.flush())
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope['type'] == 'http':
+            encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+            
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message['headers'])
+                if ('content-encoding' in headers
+                        or headers.get('content-type', '').startswith(UNCOMPRESSED_MEDIA_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                
+                compressor = StreamCompressor(encoding)
+                body = compressor.compress(body, final=not more_body)
+                headers['Content-Encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                if more_body:
+                    del headers['Content-Length']
+                else:
+                    headers['Content-Length'] = str(len(body))
+                await send(start_message)
+            else:
+                body = compressor.compress(body, final=not more_body)
+            
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+        
+        await self.app(scope, receive, send_compressed)
+
+# Requests are labelled with the route template (e.g. /api/students/{student_id})
+# rather than the raw path, so ids don't turn into new time series
+def route_template(scope) -> str:
+    partial = None
+    for route in scope['app'].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or 'unmatched'
+
+def server_timing(calls: list, elapsed: float) -> str:
+    db_seconds = sum(seconds for _, _, seconds in calls)
+    return f'db;dur={db_seconds * 1000:.2f};desc="round trips: {len(calls)}", app;dur={elapsed * 1000:.2f}'
+
+def warn_if_over_budget(method: str, route: str, calls: list):
+    if len(calls) <= DB_ROUND_TRIP_BUDGET:
+        return
+    # The commands repeated most often are usually a query issued once per item
+    counts = {}
+    for command, collection, _ in calls:
+        counts[(command, collection)] = counts.get((command, collection), 0) + 1
+    repeated = heapq.nlargest(3, counts.items(), key=lambda item: item[1])
+    logger.warning(
+        "%s %s issued %d MongoDB commands (budget %d, %.1f ms), most repeated: %s",
+        method, route, len(calls), DB_ROUND_TRIP_BUDGET,
+        sum(seconds for _, _, seconds in calls) * 1000,
+        ", ".join(f"{command} {collection} x{count}" for (command, collection), count in repeated)
+    )
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope['method']
+        route = route_template(scope)
+        status = 500
+        calls = []
+        started_at = time.perf_counter()
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if SERVER_TIMING_HEADER:
+                    # Commands issued while a streamed body is sent come after the headers
+                    MutableHeaders(raw=message['headers']).append(
+                        'Server-Timing', server_timing(calls, time.perf_counter() - started_at)
+                    )
+            await send(message)
+        
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        calls_token = request_db_calls.set(calls)
+        task = asyncio.current_task() if profiler.should_profile(route) else None
+        if task is not None:
+            profiler.begin(task, route)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if task is not None:
+                profiler.end(task)
+            request_db_calls.reset(calls_token)
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started_at)
+            REQUEST_DB_ROUND_TRIPS.labels(route).observe(len(calls))
+            warn_if_over_budget(method, route, calls)
+
 # Include router
 app.include_router(api_router)
 
@@ -670,6 +2566,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# Outermost, so the measured latency includes CORS and compression
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -677,6 +2578,87 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Startup work that needs MongoDB runs alongside the first requests rather than
+# before them, so a database that is slow to answer doesn't hold up startup
+background_tasks: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def create_indexes():
+    if not CREATE_INDEXES_ON_STARTUP:
+        return
+    try:
+        await ensure_indexes()
+    except Exception:
+        # Don't refuse to serve over an index that can't be built (e.g. duplicate ids),
+        # run `python manage.py ensure-indexes` to see the error and fix the data
+        logger.exception("Failed to create MongoDB indexes")
+
+async def index_student_names():
+    try:
+        await backfill_name_search_fields(log=logger.info)
+        name_search_state['indexed'] = True
+    except Exception:
+        # Searches keep matching unindexed names by substring meanwhile
+        logger.exception("Failed to index student names for search, run `python manage.py index-student-names`")
+
+async def load_rollups():
+    try:
+        await load_rollup_state()
+    except Exception:
+        # Retried by the first report; until then every record counts as a live one
+        logger.exception("Failed to load the daily rollup state")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    background_tasks.append(asyncio.create_task(load_rollups()))
+    background_tasks.append(asyncio.create_task(index_student_names()))
+
+@app.on_event("startup")
+async def start_import_workers():
+    for _ in range(IMPORT_JOB_WORKERS):
+        import_workers.append(asyncio.create_task(import_worker()))
+
+@app.on_event("shutdown")
+async def stop_import_workers():
+    for worker in import_workers:
+        worker.cancel()
+    # Let the cancelled workers remove the spool files of the jobs they were running
+    await asyncio.gather(*import_workers, return_exceptions=True)
+    import_workers.clear()
+    
+    # Queued and interrupted jobs live only in this process's memory, mark them as failed
+    if not pending_import_jobs:
+        return
+    for path in pending_import_jobs.values():
+        remove_spool(path)
+    jobs = await db.import_jobs.find(
+        {"id": {"$in": list(pending_import_jobs)}},
+        {"_id": 0, "id": 1, "rows_processed": 1, "added_count": 1}
+    ).to_list(None)
+    finished_at = datetime.now(timezone.utc)
+    if jobs:
+        await db.import_jobs.bulk_write([
+            UpdateOne({"id": job['id']}, {"$set": {
+                "status": "failed",
+                "message": interrupted_import_message(job),
+                "finished_at": finished_at
+            }})
+            for job in jobs
+        ], ordered=False)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    # Name indexing is resumed by the next start
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_password_pool():
+    if password_pool is not None:
+        password_pool.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
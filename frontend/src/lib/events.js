@@ -0,0 +1,57 @@
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Subscribes to the server-sent event stream at /api/events. fetch is used
+// instead of EventSource so the token stays in the Authorization header.
+// The server closes streams periodically; after any reconnect a `resync`
+// event is delivered because changes may have been missed in between.
+export function subscribeEvents(params, onEvent) {
+  const controller = new AbortController();
+  const query = new URLSearchParams(params).toString();
+
+  const connect = async () => {
+    let retryDelay = 1000;
+    let connectedBefore = false;
+    while (!controller.signal.aborted) {
+      try {
+        const token = localStorage.getItem('token');
+        const response = await fetch(`${API}/events${query ? `?${query}` : ''}`, {
+          headers: { Authorization: `Bearer ${token}` },
+          signal: controller.signal
+        });
+        if (!response.ok) throw new Error(`events stream failed: ${response.status}`);
+
+        if (connectedBefore) onEvent('resync', {});
+        connectedBefore = true;
+        retryDelay = 1000;
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let end;
+          while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const frame = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            let type = 'message';
+            let data = null;
+            for (const line of frame.split('\n')) {
+              if (line.startsWith('event: ')) type = line.slice(7);
+              else if (line.startsWith('data: ')) data = line.slice(6);
+            }
+            if (data !== null) onEvent(type, JSON.parse(data));
+          }
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        retryDelay = Math.min(retryDelay * 2, 30000);
+      }
+      await new Promise(resolve => setTimeout(resolve, retryDelay));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+}
@@ -0,0 +1,24 @@
+import axios from 'axios';
+
+// Loads one page of a paginated list endpoint; pass the previous page's
+// next_cursor to get the page after it
+export async function fetchPage(url, config = {}, cursor = null, limit = 100) {
+  const response = await axios.get(url, {
+    ...config,
+    params: { ...config.params, limit, ...(cursor ? { cursor } : {}) }
+  });
+  return response.data;
+}
+
+// Follows next_cursor until every page is loaded; only for lists that are
+// bounded by the query, such as the students of one class
+export async function fetchAllPages(url, config = {}) {
+  const items = [];
+  let cursor = null;
+  do {
+    const page = await fetchPage(url, config, cursor, 500);
+    items.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+}
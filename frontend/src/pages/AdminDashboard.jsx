@@ -6,6 +6,7 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '.
 import { Badge } from '../components/ui/badge';
 import { LogOut, Users, TrendingUp, TrendingDown, Activity } from 'lucide-react';
 import { toast } from 'sonner';
+import { subscribeEvents } from '../lib/events';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -18,6 +19,22 @@ const AdminDashboard = ({ user, onLogout }) => {
     fetchStatistics();
   }, []);
 
+  // Reload the statistics when behavior changes are pushed, at most every 2 seconds
+  useEffect(() => {
+    let refreshTimer = null;
+    const unsubscribe = subscribeEvents({}, () => {
+      if (refreshTimer) return;
+      refreshTimer = setTimeout(() => {
+        refreshTimer = null;
+        fetchStatistics();
+      }, 2000);
+    });
+    return () => {
+      clearTimeout(refreshTimer);
+      unsubscribe();
+    };
+  }, []);
+
   const fetchStatistics = async () => {
     try {
       const token = localStorage.getItem('token');
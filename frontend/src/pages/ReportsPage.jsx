@@ -8,7 +8,6 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '.
 import { Badge } from '../components/ui/badge';
 import { toast } from 'sonner';
 import { ArrowRight, Download, FileSpreadsheet, Calendar, TrendingUp, TrendingDown } from 'lucide-react';
-import * as XLSX from 'xlsx';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -28,13 +27,10 @@ const ReportsPage = ({ user }) => {
   const fetchClasses = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${API}/students`, {
+      const response = await axios.get(`${API}/classes`, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      
-      // Extract unique classes
-      const uniqueClasses = [...new Set(response.data.map(s => s.class_name))].sort();
-      setClasses(uniqueClasses);
+      setClasses(response.data);
     } catch (error) {
       console.error('Failed to fetch classes');
     }
@@ -56,54 +52,42 @@ const ReportsPage = ({ user }) => {
     }
   };
 
-  const exportToExcel = () => {
+  const exportReport = async (format) => {
     if (!reportData || !reportData.data) {
       toast.error('لا توجد بيانات للتصدير');
       return;
     }
 
-    // Prepare data for Excel
-    const excelData = reportData.data.map((row, index) => ({
-      'الترتيب': index + 1,
-      'اسم الطالبة': row.student_name,
-      'الصف': row.class_name,
-      'إجمالي النقاط': row.total_points,
-      'السلوكيات الإيجابية': row.positive_count,
-      'نقاط إيجابية': row.positive_points,
-      'السلوكيات السلبية': row.negative_count,
-      'نقاط سلبية': row.negative_points,
-      'صافي النقاط': row.net_points,
-      'إجمالي السلوكيات': row.total_behaviors
-    }));
-
-    // Create workbook
-    const ws = XLSX.utils.json_to_sheet(excelData);
-    const wb = XLSX.utils.book_new();
-    XLSX.utils.book_append_sheet(wb, ws, 'التقرير');
+    try {
+      const token = localStorage.getItem('token');
+      const params = { format };
+      if (selectedClass !== 'all') params.class_name = selectedClass;
 
-    // Set column widths
-    const colWidths = [
-      { wch: 10 }, // الترتيب
-      { wch: 30 }, // اسم الطالبة
-      { wch: 15 }, // الصف
-      { wch: 15 }, // إجمالي النقاط
-      { wch: 20 }, // السلوكيات الإيجابية
-      { wch: 15 }, // نقاط إيجابية
-      { wch: 20 }, // السلوكيات السلبية
-      { wch: 15 }, // نقاط سلبية
-      { wch: 15 }, // صافي النقاط
-      { wch: 20 }  // إجمالي السلوكيات
-    ];
-    ws['!cols'] = colWidths;
+      // The server streams the file, so large reports are never built in the browser
+      const response = await axios.get(`${API}/reports/${reportType}/export`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params,
+        responseType: 'blob'
+      });
 
-    // Generate file name
-    const reportTypeAr = reportType === 'weekly' ? 'أسبوعي' : 'شهري';
-    const classText = selectedClass === 'all' ? 'جميع_الصفوف' : selectedClass.replace('/', '_');
-    const fileName = `تقرير_${reportTypeAr}_${classText}_${new Date().toLocaleDateString('ar-SA').replace(/\//g, '-')}.xlsx`;
+      // Generate file name
+      const reportTypeAr = reportType === 'weekly' ? 'أسبوعي' : 'شهري';
+      const classText = selectedClass === 'all' ? 'جميع_الصفوف' : selectedClass.replace('/', '_');
+      const fileName = `تقرير_${reportTypeAr}_${classText}_${new Date().toLocaleDateString('ar-SA').replace(/\//g, '-')}.${format}`;
 
-    // Save file
-    XLSX.writeFile(wb, fileName);
-    toast.success('تم تصدير التقرير بنجاح');
+      // Save file
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = fileName;
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+      toast.success('تم تصدير التقرير بنجاح');
+    } catch (error) {
+      toast.error('فشل تصدير التقرير');
+    }
   };
 
   return (
@@ -236,9 +220,17 @@ const ReportsPage = ({ user }) => {
             </div>
 
             {/* Export Button */}
-            <div className="mb-4 flex justify-end">
+            <div className="mb-4 flex justify-end gap-2">
+              <Button 
+                onClick={() => exportReport('csv')}
+                variant="outline"
+                data-testid="export-csv-button"
+              >
+                <Download className="ml-2 h-4 w-4" />
+                تصدير CSV
+              </Button>
               <Button 
-                onClick={exportToExcel}
+                onClick={() => exportReport('xlsx')}
                 className="bg-green-600 hover:bg-green-700"
                 data-testid="export-button"
               >
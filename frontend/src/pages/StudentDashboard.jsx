@@ -7,6 +7,7 @@ import { Badge } from '../components/ui/badge';
 import { Progress } from '../components/ui/progress';
 import { LogOut, Award, TrendingUp, TrendingDown } from 'lucide-react';
 import { toast } from 'sonner';
+import { fetchPage } from '../lib/pagination';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -14,6 +15,9 @@ const API = `${BACKEND_URL}/api`;
 const StudentDashboard = ({ user, onLogout }) => {
   const [studentData, setStudentData] = useState(null);
   const [behaviorRecords, setBehaviorRecords] = useState([]);
+  const [summary, setSummary] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -30,11 +34,18 @@ const StudentDashboard = ({ user, onLogout }) => {
       });
       setStudentData(studentResponse.data);
 
-      // Get behavior records
-      const behaviorResponse = await axios.get(`${API}/behavior/student/${studentResponse.data.id}`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      setBehaviorRecords(behaviorResponse.data);
+      // Totals cover the whole history, the records themselves load a page at a time
+      const [summaryResponse, page] = await Promise.all([
+        axios.get(`${API}/behavior/student/${studentResponse.data.id}/summary`, {
+          headers: { Authorization: `Bearer ${token}` }
+        }),
+        fetchPage(`${API}/behavior/student/${studentResponse.data.id}`, {
+          headers: { Authorization: `Bearer ${token}` }
+        })
+      ]);
+      setSummary(summaryResponse.data);
+      setBehaviorRecords(page.items);
+      setNextCursor(page.next_cursor);
     } catch (error) {
       toast.error('فشل تحميل البيانات');
     } finally {
@@ -42,6 +53,22 @@ const StudentDashboard = ({ user, onLogout }) => {
     }
   };
 
+  const loadMoreRecords = async () => {
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('token');
+      const page = await fetchPage(`${API}/behavior/student/${studentData.id}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      }, nextCursor);
+      setBehaviorRecords(current => [...current, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      toast.error('فشل تحميل المزيد من السجلات');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDeleteBehavior = async (behaviorId) => {
     if (!window.confirm('هل أنت متأكد من حذف هذا السجل؟')) {
       return;
@@ -59,10 +86,10 @@ const StudentDashboard = ({ user, onLogout }) => {
     }
   };
 
-  const positiveRecords = behaviorRecords.filter(r => r.behavior_type === 'positive');
-  const negativeRecords = behaviorRecords.filter(r => r.behavior_type === 'negative');
-  const totalPositivePoints = positiveRecords.reduce((sum, r) => sum + r.points, 0);
-  const totalNegativePoints = negativeRecords.reduce((sum, r) => sum + r.points, 0);
+  const positiveCount = summary?.positive_count || 0;
+  const negativeCount = summary?.negative_count || 0;
+  const totalPositivePoints = summary?.positive_points || 0;
+  const totalNegativePoints = summary?.negative_points || 0;
 
   if (loading) {
     return <div className="min-h-screen flex items-center justify-center" data-testid="loading-state">جاري التحميل...</div>;
@@ -117,14 +144,14 @@ const StudentDashboard = ({ user, onLogout }) => {
             <div className="grid md:grid-cols-2 gap-6 mt-6">
               <div className="text-center p-4 bg-green-50 rounded-lg border-2 border-green-200" data-testid="positive-card">
                 <TrendingUp className="w-8 h-8 text-green-600 mx-auto mb-2" />
-                <div className="text-3xl font-bold text-green-600" data-testid="positive-count">{positiveRecords.length}</div>
+                <div className="text-3xl font-bold text-green-600" data-testid="positive-count">{positiveCount}</div>
                 <p className="text-gray-600 mt-1" data-testid="positive-label">سلوكيات إيجابية</p>
                 <p className="text-sm text-green-600 font-bold mt-2" data-testid="positive-points">+{totalPositivePoints} نقطة</p>
               </div>
               
               <div className="text-center p-4 bg-red-50 rounded-lg border-2 border-red-200" data-testid="negative-card">
                 <TrendingDown className="w-8 h-8 text-red-600 mx-auto mb-2" />
-                <div className="text-3xl font-bold text-red-600" data-testid="negative-count">{negativeRecords.length}</div>
+                <div className="text-3xl font-bold text-red-600" data-testid="negative-count">{negativeCount}</div>
                 <p className="text-gray-600 mt-1" data-testid="negative-label">سلوكيات سلبية</p>
                 <p className="text-sm text-red-600 font-bold mt-2" data-testid="negative-points">-{totalNegativePoints} نقطة</p>
               </div>
@@ -174,6 +201,13 @@ const StudentDashboard = ({ user, onLogout }) => {
                 </TableBody>
               </Table>
             )}
+            {nextCursor && (
+              <div className="flex justify-center mt-4">
+                <Button variant="outline" onClick={loadMoreRecords} disabled={loadingMore} data-testid="load-more-records">
+                  {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+                </Button>
+              </div>
+            )}
           </CardContent>
         </Card>
       </main>
@@ -11,9 +11,13 @@ import { Badge } from '../components/ui/badge';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, DialogTrigger } from '../components/ui/dialog';
 import { LogOut, Plus, Search, Upload, FileSpreadsheet, Trash2, Award } from 'lucide-react';
 import { toast } from 'sonner';
+import { fetchAllPages, fetchPage } from '../lib/pagination';
+import { subscribeEvents } from '../lib/events';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const ALL_CLASS_STUDENTS = '__all_class__';
+const ALL_CLASSES = 'all';
 
 const TeacherDashboard = ({ user, onLogout }) => {
   const [students, setStudents] = useState([]);
@@ -35,29 +39,102 @@ const TeacherDashboard = ({ user, onLogout }) => {
   const [uploadFile, setUploadFile] = useState(null);
   const [uploading, setUploading] = useState(false);
   const [topStudentsByClass, setTopStudentsByClass] = useState({});
+  const [classes, setClasses] = useState([]);
+  const [tableClass, setTableClass] = useState(ALL_CLASSES);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [classStudents, setClassStudents] = useState([]);
   const fileInputRef = useRef(null);
+  const tableClassRef = useRef(ALL_CLASSES);
 
   useEffect(() => {
-    fetchStudents();
+    fetchClasses();
     fetchTopStudents();
   }, []);
 
+  // The table shows one class (or the first page of the school) and loads more on demand
   useEffect(() => {
-    const filtered = students.filter(student => 
-      student.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      student.class_name.toLowerCase().includes(searchTerm.toLowerCase())
-    );
-    setFilteredStudents(filtered);
+    tableClassRef.current = tableClass;
+    fetchStudents(tableClass);
+  }, [tableClass]);
+
+  // The behavior dialog only needs the students of the class it is recording for
+  useEffect(() => {
+    if (!selectedGrade || !selectedSection) {
+      setClassStudents([]);
+      return;
+    }
+    fetchClassStudents(`${selectedGrade}/${selectedSection}`);
+  }, [selectedGrade, selectedSection]);
+
+  // Keep points and the top students current from the live event stream
+  useEffect(() => {
+    let refreshTimer = null;
+    const refreshTopStudents = () => {
+      clearTimeout(refreshTimer);
+      refreshTimer = setTimeout(fetchTopStudents, 500);
+    };
+    const unsubscribe = subscribeEvents({}, (type, event) => {
+      if (type === 'resync') {
+        fetchStudents(tableClassRef.current);
+        fetchTopStudents();
+        return;
+      }
+      if (type !== 'behavior_created' && type !== 'behavior_deleted') return;
+      const updatePoints = current => current.map(student =>
+        student.id === event.student_id ? { ...student, total_points: event.total_points } : student
+      );
+      setStudents(updatePoints);
+      setFilteredStudents(updatePoints);
+      setClassStudents(updatePoints);
+      refreshTopStudents();
+    });
+    return () => {
+      clearTimeout(refreshTimer);
+      unsubscribe();
+    };
+  }, []);
+
+  useEffect(() => {
+    if (!searchTerm.trim()) setFilteredStudents(students);
   }, [searchTerm, students]);
 
-  const fetchStudents = async () => {
+  // Names are searched on the server, which also matches Arabic spelling variants
+  useEffect(() => {
+    const term = searchTerm.trim();
+    if (!term) return;
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const token = localStorage.getItem('token');
+        const response = await axios.get(`${API}/students/search`, {
+          headers: { Authorization: `Bearer ${token}` },
+          params: { q: term, limit: 100, ...(tableClass !== ALL_CLASSES ? { class_name: tableClass } : {}) }
+        });
+        if (!cancelled) setFilteredStudents(response.data.items);
+      } catch (error) {
+        if (!cancelled) toast.error('فشل البحث عن الطالبات');
+      }
+    }, 250);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, tableClass]);
+
+  const studentsParams = (className) => (className === ALL_CLASSES ? {} : { class_name: className });
+
+  const fetchStudents = async (className = tableClassRef.current) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${API}/students`, {
-        headers: { Authorization: `Bearer ${token}` }
+      const page = await fetchPage(`${API}/students`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: studentsParams(className)
       });
-      setStudents(response.data);
-      setFilteredStudents(response.data);
+      setStudents(page.items);
+      setFilteredStudents(page.items);
+      setNextCursor(page.next_cursor);
     } catch (error) {
       toast.error('فشل تحميل قائمة الطالبات');
     } finally {
@@ -65,6 +142,48 @@ const TeacherDashboard = ({ user, onLogout }) => {
     }
   };
 
+  const loadMoreStudents = async () => {
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('token');
+      const page = await fetchPage(`${API}/students`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: studentsParams(tableClass)
+      }, nextCursor);
+      setStudents(current => [...current, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      toast.error('فشل تحميل المزيد من الطالبات');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const fetchClassStudents = async (className) => {
+    try {
+      const token = localStorage.getItem('token');
+      const items = await fetchAllPages(`${API}/students`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { class_name: className }
+      });
+      setClassStudents(items);
+    } catch (error) {
+      toast.error('فشل تحميل طالبات الفصل');
+    }
+  };
+
+  const fetchClasses = async () => {
+    try {
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/classes`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setClasses(response.data);
+    } catch (error) {
+      console.error('Failed to fetch classes');
+    }
+  };
+
   const fetchTopStudents = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -89,6 +208,7 @@ const TeacherDashboard = ({ user, onLogout }) => {
       });
       toast.success('تم حذف الطالبة بنجاح');
       fetchStudents();
+      fetchClasses();
       fetchTopStudents();
     } catch (error) {
       toast.error('فشل حذف الطالبة');
@@ -105,14 +225,26 @@ const TeacherDashboard = ({ user, onLogout }) => {
 
     try {
       const token = localStorage.getItem('token');
-      await axios.post(`${API}/behavior`, {
-        student_id: selectedStudent,
-        behavior_type: behaviorType,
-        points: parseInt(points),
-        description
-      }, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
+      if (selectedStudent === ALL_CLASS_STUDENTS) {
+        // One request awards the whole class
+        await axios.post(`${API}/behavior/bulk`, {
+          class_name: `${selectedGrade}/${selectedSection}`,
+          behavior_type: behaviorType,
+          points: parseInt(points),
+          description
+        }, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+      } else {
+        await axios.post(`${API}/behavior`, {
+          student_id: selectedStudent,
+          behavior_type: behaviorType,
+          points: parseInt(points),
+          description
+        }, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+      }
 
       toast.success('تم تسجيل السلوك بنجاح');
       setIsDialogOpen(false);
@@ -134,8 +266,7 @@ const TeacherDashboard = ({ user, onLogout }) => {
     if (!selectedGrade || !selectedSection) {
       return [];
     }
-    const className = `${selectedGrade}/${selectedSection}`;
-    return students.filter(s => s.class_name === className);
+    return classStudents;
   };
 
   // Get available sections for behavior dialog
@@ -170,6 +301,7 @@ const TeacherDashboard = ({ user, onLogout }) => {
       setNewStudentGrade('');
       setNewStudentSection('');
       fetchStudents();
+      fetchClasses();
     } catch (error) {
       toast.error('فشل إضافة الطالبة');
     }
@@ -213,7 +345,21 @@ const TeacherDashboard = ({ user, onLogout }) => {
         }
       });
 
-      const result = response.data;
+      // The import runs in the background, poll the job until it finishes
+      let result = response.data;
+      while (result.status === 'queued' || result.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobResponse = await axios.get(`${API}/import-jobs/${result.id}`, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        result = jobResponse.data;
+      }
+
+      if (result.status === 'failed') {
+        toast.error(result.message || 'فشل استيراد الطالبات');
+        return;
+      }
+
       toast.success(`تمت إضافة ${result.added_count} طالبة بنجاح${result.skipped_count > 0 ? `. تم تجاوز ${result.skipped_count} سجل` : ''}`);
       
       if (result.errors && result.errors.length > 0) {
@@ -226,6 +372,7 @@ const TeacherDashboard = ({ user, onLogout }) => {
         fileInputRef.current.value = '';
       }
       fetchStudents();
+      fetchClasses();
     } catch (error) {
       toast.error(error.response?.data?.detail || 'فشل استيراد الطالبات');
     } finally {
@@ -479,11 +626,16 @@ const TeacherDashboard = ({ user, onLogout }) => {
                         {getFilteredStudents().length === 0 ? (
                           <SelectItem value="none" disabled>لا توجد طالبات في هذا الفصل</SelectItem>
                         ) : (
-                          getFilteredStudents().map((student) => (
-                            <SelectItem key={student.id} value={student.id} data-testid={`student-option-${student.id}`}>
-                              {student.name}
-                            </SelectItem>
-                          ))
+                          [
+                            <SelectItem key={ALL_CLASS_STUDENTS} value={ALL_CLASS_STUDENTS} data-testid="student-option-all-class">
+                              جميع طالبات الفصل
+                            </SelectItem>,
+                            ...getFilteredStudents().map((student) => (
+                              <SelectItem key={student.id} value={student.id} data-testid={`student-option-${student.id}`}>
+                                {student.name}
+                              </SelectItem>
+                            ))
+                          ]
                         )}
                       </SelectContent>
                     </Select>
@@ -591,9 +743,24 @@ const TeacherDashboard = ({ user, onLogout }) => {
 
         {/* Students Table */}
         <Card className="shadow-lg" data-testid="students-table-card">
-          <CardHeader>
-            <CardTitle data-testid="students-table-title">قائمة الطالبات</CardTitle>
-            <CardDescription data-testid="students-table-description">جميع طالبات المدرسة ونقاطهن</CardDescription>
+          <CardHeader className="flex flex-row items-start justify-between gap-4 flex-wrap">
+            <div>
+              <CardTitle data-testid="students-table-title">قائمة الطالبات</CardTitle>
+              <CardDescription data-testid="students-table-description">جميع طالبات المدرسة ونقاطهن</CardDescription>
+            </div>
+            <Select value={tableClass} onValueChange={setTableClass}>
+              <SelectTrigger className="w-48" data-testid="table-class-select">
+                <SelectValue />
+              </SelectTrigger>
+              <SelectContent>
+                <SelectItem value={ALL_CLASSES}>جميع الفصول</SelectItem>
+                {classes.map((className) => (
+                  <SelectItem key={className} value={className}>
+                    {className}
+                  </SelectItem>
+                ))}
+              </SelectContent>
+            </Select>
           </CardHeader>
           <CardContent>
             <Table>
@@ -632,6 +799,13 @@ const TeacherDashboard = ({ user, onLogout }) => {
                 ))}
               </TableBody>
             </Table>
+            {nextCursor && !searchTerm.trim() && (
+              <div className="flex justify-center mt-4">
+                <Button variant="outline" onClick={loadMoreStudents} disabled={loadingMore} data-testid="load-more-students">
+                  {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+                </Button>
+              </div>
+            )}
           </CardContent>
         </Card>
       </main>
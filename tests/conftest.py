@@ -0,0 +1,68 @@
+import os
+import sys
+from pathlib import Path
+
+import pymongo
+import pytest
+
+# server.py reads its connection settings at import time; Motor connects lazily,
+# so the unit tests import it without a running MongoDB. Tests that use the
+# api fixture need one at MONGO_URL and are skipped without it. They drop every
+# collection of TEST_DB_NAME, never the app's own DB_NAME.
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME", "rowad_tests")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    probe = pymongo.MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000)
+    try:
+        probe.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip("MongoDB is not reachable at MONGO_URL")
+    finally:
+        probe.close()
+
+    # One app for the whole session: the Motor client, locks and queues in
+    # server.py are bound to the event loop that first uses them
+    with TestClient(server.app) as client:
+        yield client
+
+
+async def reset_database():
+    for name in await server.db.list_collection_names():
+        await server.db.drop_collection(name)
+    await server.ensure_indexes()
+    server.rollup_state.update({"live_since": None, "backfilled": False, "warned": False})
+    await server.load_rollup_state()
+
+
+@pytest.fixture
+def api(app_client):
+    # Each test starts from an empty database and empty in-process caches
+    app_client.portal.call(reset_database)
+    server.leaderboard.__init__(server.LEADERBOARD_MAX_STUDENTS, server.LEADERBOARD_REFRESH_SECONDS)
+    server.user_cache.entries.clear()
+    server.statistics_cache.update({"value": None, "version": None, "expires_at": 0.0})
+    return app_client
+
+
+@pytest.fixture
+def admin_headers(api):
+    response = api.post("/api/auth/register", json={
+        "name": "Admin", "email": "admin@tests.local", "password": "secret", "role": "admin"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def add_student(api, admin_headers):
+    def add(name="سارة", class_name="1/أ") -> dict:
+        response = api.post("/api/students", json={"name": name, "class_name": class_name}, headers=admin_headers)
+        assert response.status_code == 200
+        return response.json()
+    return add
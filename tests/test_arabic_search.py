@@ -0,0 +1,36 @@
+import pytest
+
+from server import name_search_fields, normalize_arabic
+
+
+@pytest.mark.parametrize("variant, expected", [
+    ("أحمد", "احمد"),
+    ("إيمان", "ايمان"),
+    ("آمنة", "امنه"),
+    ("فاطمة", "فاطمه"),
+    ("مصطفى", "مصطفي"),
+    ("مُحَمَّد", "محمد"),
+    ("عبـــدالله", "عبدالله"),
+])
+def test_normalize_arabic_folds_spelling_variants(variant, expected):
+    assert normalize_arabic(variant) == expected
+
+
+def test_normalize_arabic_collapses_whitespace():
+    assert normalize_arabic("  سارة   أحمد ") == "ساره احمد"
+
+
+def test_name_search_fields_add_tokens_without_leading_al():
+    fields = name_search_fields("فاطمة الزهراء")
+    assert fields["name_normalized"] == "فاطمه الزهراء"
+    assert fields["name_tokens"] == ["فاطمه", "الزهراء", "زهراء"]
+
+
+def test_name_search_fields_keep_short_al_words():
+    # Stripping "ال" from a three letter word would leave a single letter
+    assert name_search_fields("آل سعد")["name_tokens"] == ["ال", "سعد"]
+    assert name_search_fields("الي")["name_tokens"] == ["الي"]
+
+
+def test_name_search_fields_drop_duplicate_tokens():
+    assert name_search_fields("أحمد احمد")["name_tokens"] == ["احمد"]
@@ -0,0 +1,73 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+
+def student_doc(api, student_id):
+    return api.portal.call(lambda: server.db.students.find_one({"id": student_id}, {"_id": 0}))
+
+
+def test_behavior_points_are_applied_with_the_record(api, admin_headers, add_student):
+    student = add_student()
+    for behavior_type, points in (("positive", 5), ("negative", 2)):
+        response = api.post("/api/behavior", json={
+            "student_id": student["id"], "behavior_type": behavior_type, "points": points, "description": ""
+        }, headers=admin_headers)
+        assert response.status_code == 200
+    assert student_doc(api, student["id"])["total_points"] == 3
+
+
+def test_behavior_points_are_taken_back_when_the_record_insert_fails(api, admin_headers, add_student, monkeypatch):
+    student = add_student()
+    api.portal.call(lambda: server.db.behavior_records.insert_one({"id": "taken-record", "student_id": "other"}))
+    monkeypatch.setattr(server.uuid, "uuid4", lambda: "taken-record")
+
+    with pytest.raises(DuplicateKeyError):
+        api.post("/api/behavior", json={
+            "student_id": student["id"], "behavior_type": "positive", "points": 5, "description": ""
+        }, headers=admin_headers)
+
+    assert student_doc(api, student["id"])["total_points"] == 0
+    assert api.portal.call(lambda: server.db.behavior_daily_rollups.count_documents({})) == 0
+
+
+def test_behavior_for_a_missing_student_changes_nothing(api, admin_headers):
+    response = api.post("/api/behavior", json={
+        "student_id": "missing", "behavior_type": "positive", "points": 5, "description": ""
+    }, headers=admin_headers)
+    assert response.status_code == 404
+    assert api.portal.call(lambda: server.db.behavior_records.count_documents({})) == 0
+
+
+def test_bulk_award_reports_each_student_in_request_order(api, admin_headers, add_student, monkeypatch):
+    a, b, c = add_student("سارة"), add_student("نورة"), add_student("هند")
+    api.portal.call(lambda: server.db.behavior_records.insert_one({"id": "r3", "student_id": "other"}))
+    record_ids = iter(["r1", "r2", "r3"])
+    monkeypatch.setattr(server.uuid, "uuid4", lambda: next(record_ids))
+
+    response = api.post("/api/behavior/bulk", json={
+        "student_ids": [a["id"], "missing", b["id"], a["id"], c["id"]],
+        "behavior_type": "positive", "points": 3, "description": ""
+    }, headers=admin_headers)
+
+    results = response.json()
+    assert [(r["student_id"], r["success"], r["record_id"]) for r in results] == [
+        (a["id"], True, "r1"), ("missing", False, None), (b["id"], True, "r2"), (c["id"], False, None)
+    ]
+    assert results[1]["error"] == "الطالبة غير موجودة"
+    assert results[3]["error"]
+    # Only students whose record was stored get the points
+    assert [student_doc(api, s["id"])["total_points"] for s in (a, b, c)] == [3, 3, 0]
+
+
+def test_bulk_award_for_a_class(api, admin_headers, add_student):
+    a, b = add_student("سارة", "1/أ"), add_student("نورة", "1/أ")
+    other = add_student("هند", "2/ب")
+
+    response = api.post("/api/behavior/bulk", json={
+        "class_name": "1/أ", "behavior_type": "negative", "points": 2, "description": ""
+    }, headers=admin_headers)
+
+    assert sorted(r["student_id"] for r in response.json() if r["success"]) == sorted([a["id"], b["id"]])
+    assert [student_doc(api, s["id"])["total_points"] for s in (a, b, other)] == [-2, -2, 0]
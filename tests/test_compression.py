@@ -0,0 +1,22 @@
+import pytest
+
+from server import choose_encoding
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("br;q=1.0, gzip;q=0.8", "br"),
+    ("GZIP", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("gzip;q=0, *", "br"),
+    ("identity", None),
+    ("", None),
+    ("br;q=abc, gzip;q=0.1", "gzip"),
+])
+def test_choose_encoding_honours_q_values(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
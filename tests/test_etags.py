@@ -0,0 +1,76 @@
+import server
+
+
+def get(api, headers, url, etag=None, **params):
+    if etag:
+        headers = {**headers, "If-None-Match": etag}
+    return api.get(url, params=params, headers=headers)
+
+
+def test_repeated_reads_are_answered_with_304_until_a_write(api, admin_headers, add_student):
+    add_student()
+    first = get(api, admin_headers, "/api/students")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    cached = get(api, admin_headers, "/api/students", etag)
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert get(api, admin_headers, "/api/students", "*").status_code == 304
+
+    add_student("نورة")
+    fresh = get(api, admin_headers, "/api/students", etag)
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+    assert len(fresh.json()["items"]) == 2
+
+
+def test_etag_depends_on_query_parameters(api, admin_headers, add_student):
+    add_student()
+    tags = {
+        get(api, admin_headers, "/api/students", limit=1).headers["etag"],
+        get(api, admin_headers, "/api/students", limit=2).headers["etag"],
+        get(api, admin_headers, "/api/students/top/by-class", n=1).headers["etag"],
+        get(api, admin_headers, "/api/students/top/by-class", n=2).headers["etag"],
+    }
+    assert len(tags) == 4
+    one = get(api, admin_headers, "/api/students", limit=1).headers["etag"]
+    assert get(api, admin_headers, "/api/students", one, limit=2).status_code == 200
+
+
+def test_class_etag_ignores_writes_to_other_classes(api, admin_headers, add_student):
+    add_student("سارة", "1/أ")
+    etag = get(api, admin_headers, "/api/students", class_name="1/أ").headers["etag"]
+    add_student("نورة", "2/ب")
+    assert get(api, admin_headers, "/api/students", etag, class_name="1/أ").status_code == 304
+
+
+def top_points(api, headers, etag=None):
+    response = get(api, headers, "/api/students/top/by-class", etag, n=5)
+    return response.status_code, {s["id"]: s["total_points"] for s in response.json()["1/أ"]}, response.headers["etag"]
+
+
+def test_leaderboard_is_read_from_mongodb_after_another_workers_write(api, admin_headers, add_student):
+    sid = add_student()["id"]
+    api.post("/api/behavior", json={"student_id": sid, "behavior_type": "positive", "points": 2, "description": ""},
+             headers=admin_headers)
+    status, points, etag = top_points(api, admin_headers)
+    assert points == {sid: 2}
+    # Local writes keep this worker's cache current
+    assert server.leaderboard.is_current(api.portal.call(server.data_versions.current))
+
+    # Another worker awards points: MongoDB and the shared version change, this
+    # worker's leaderboard doesn't
+    api.portal.call(lambda: server.db.students.update_one({"id": sid}, {"$inc": {"total_points": 5}}))
+    api.portal.call(lambda: server.db.data_versions.update_one({"_id": "all"}, {"$inc": {"version": 1}}))
+
+    status, points, new_etag = top_points(api, admin_headers, etag)
+    assert status == 200
+    assert points == {sid: 7}
+    assert new_etag != etag
+    assert not server.leaderboard.is_current(api.portal.call(server.data_versions.current))
+
+    # Once rebuilt, the cache holds the current version again
+    api.post("/api/students/top/rebuild", headers=admin_headers)
+    assert server.leaderboard.is_current(api.portal.call(server.data_versions.current))
+    assert top_points(api, admin_headers)[1] == {sid: 7}
@@ -0,0 +1,41 @@
+import server
+
+
+def roster_row(excel_row, name, user_id=None, student_id=None):
+    user = server.User(name=name, email=f"{name}@tamayyuz.local", role="student")
+    if user_id:
+        user.id = user_id
+    student = server.Student(user_id=user.id, name=name, class_name="1/أ")
+    if student_id:
+        student.id = student_id
+    return excel_row, "123456", user.model_dump(), server.student_document(student)
+
+
+def test_insert_student_batch_maps_failures_to_excel_rows(api):
+    # A user and a student that already exist make one row fail on each insert
+    api.portal.call(lambda: server.db.users.insert_one({"id": "taken-user", "name": "قديمة"}))
+    api.portal.call(lambda: server.db.students.insert_one({"id": "taken-student", "name": "قديمة", "class_name": "2/ب"}))
+    batch = [
+        roster_row(2, "سارة"),
+        roster_row(3, "نورة", user_id="taken-user"),
+        roster_row(4, "هند", student_id="taken-student"),
+        roster_row(5, "ريم"),
+    ]
+
+    added, errors = api.portal.call(server.insert_student_batch, batch)
+
+    assert added == 2
+    assert [error.split(":")[0] for error in errors] == ["خطأ في الصف 3", "خطأ في الصف 4"]
+    students = api.portal.call(lambda: server.db.students.find({"class_name": "1/أ"}).to_list(None))
+    assert sorted(s["name"] for s in students) == ["ريم", "سارة"]
+    # The account made for row 4 is removed with its failed student; the one that
+    # already existed for row 3 is left alone
+    users = api.portal.call(lambda: server.db.users.find({}, {"_id": 0, "name": 1}).to_list(None))
+    assert sorted(u["name"] for u in users) == ["ريم", "سارة", "قديمة"]
+
+
+def test_insert_student_batch_hashes_each_password(api):
+    _, _, user_doc, _ = row = roster_row(2, "سارة")
+    api.portal.call(server.insert_student_batch, [row])
+    stored = api.portal.call(lambda: server.db.users.find_one({"id": user_doc["id"]}))
+    assert server.verify_password("123456", stored["password_hash"])
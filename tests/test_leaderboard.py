@@ -0,0 +1,60 @@
+import pytest
+
+from server import Leaderboard
+
+
+def student(student_id, class_name, total_points):
+    return {"id": student_id, "name": student_id, "class_name": class_name, "total_points": total_points}
+
+
+@pytest.fixture
+def board():
+    board = Leaderboard(max_students=10, refresh_seconds=60)
+    board.enabled = True
+    board.add_students([
+        student("a", "1/أ", 5),
+        student("b", "1/أ", 12),
+        student("c", "2/ب", 8),
+        student("d", "2/ب", 8),
+    ])
+    return board
+
+
+def ids(students):
+    return [s["id"] for s in students]
+
+
+def test_leaderboard_orders_by_points_then_id(board):
+    assert {name: ids(top) for name, top in board.top_by_class(5).items()} == {"1/أ": ["b", "a"], "2/ب": ["c", "d"]}
+    assert ids(board.top_overall(3)) == ["b", "c", "d"]
+
+
+def test_leaderboard_adjust_points_moves_the_student(board):
+    board.adjust_points("a", 10)
+    assert ids(board.top_by_class(5)["1/أ"]) == ["a", "b"]
+    assert board.students["a"]["total_points"] == 15
+    board.adjust_points("d", -20)
+    assert ids(board.top_overall(4)) == ["a", "b", "c", "d"]
+
+
+def test_leaderboard_remove_drops_empty_classes(board):
+    board.remove_student("c")
+    board.remove_student("d")
+    assert list(board.top_by_class(5)) == ["1/أ"]
+    board.remove_student("missing")
+
+
+def test_leaderboard_disables_itself_past_max_students(board):
+    board.add_students([student(f"x{i}", "3/ج", i) for i in range(7)])
+    assert not board.enabled
+    assert board.top_overall(5) == []
+
+
+def test_leaderboard_records_writes_made_during_a_rebuild(board):
+    board.rebuilding = True
+    board.adjust_points("a", 100)
+    board.add_students([student("e", "1/أ", 1)])
+    assert board.touched == {"a", "e"}
+    # Left for the rebuild to read again
+    assert board.students["a"]["total_points"] == 5
+    assert "e" not in board.students
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_migrate_string_dates_resumes_after_the_last_batch(api):
+    base = datetime(2024, 3, 1, 8, 30, tzinfo=timezone.utc)
+    api.portal.call(lambda: server.db.behavior_records.insert_many([
+        {"id": f"r{i}", "date": (base + timedelta(days=i)).isoformat(), "created_at": (base + timedelta(days=i)).isoformat()}
+        for i in range(5)
+    ]))
+
+    def stop_after_first_batch(message):
+        raise Interrupted(message)
+
+    with pytest.raises(Interrupted, match="behavior_records: 2 documents converted"):
+        api.portal.call(lambda: server.migrate_string_dates(batch_size=2, log=stop_after_first_batch))
+
+    messages = []
+    api.portal.call(lambda: server.migrate_string_dates(batch_size=2, log=messages.append))
+
+    # The second run starts after the checkpoint rather than from the first document
+    assert messages == ["behavior_records: 4 documents converted", "behavior_records: 5 documents converted"]
+    records = api.portal.call(lambda: server.db.behavior_records.find({}, {"_id": 0}).sort("id", 1).to_list(None))
+    assert [r["date"] for r in records] == [base + timedelta(days=i) for i in range(5)]
+    assert all(isinstance(r["created_at"], datetime) for r in records)
+    checkpoint = api.portal.call(lambda: server.db.migrations.find_one({"_id": "string_dates:behavior_records"}))
+    assert checkpoint["converted"] == 5 and checkpoint["completed_at"] is not None
+
+
+def test_parse_stored_date_treats_naive_strings_as_utc():
+    assert server.parse_stored_date("2024-03-01T08:30:00") == datetime(2024, 3, 1, 8, 30, tzinfo=timezone.utc)
+    aware = datetime(2024, 3, 1, 8, 30, tzinfo=timezone(timedelta(hours=3)))
+    assert server.parse_stored_date(aware.isoformat()) == aware
+    assert server.parse_stored_date(aware) is aware
+
+
+def test_behavior_history_pages_across_string_and_native_dates(api, admin_headers, add_student):
+    sid = add_student()["id"]
+    base = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    api.portal.call(lambda: server.db.behavior_records.insert_many([
+        {"id": f"r{i}", "student_id": sid, "teacher_id": "t", "behavior_type": "positive", "points": 1,
+         "description": "", "date": date, "created_at": date}
+        for i, date in enumerate([
+            base, base + timedelta(days=1), (base + timedelta(days=2)).isoformat(),
+            base + timedelta(days=3), (base + timedelta(days=4)).isoformat(),
+        ])
+    ]))
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = api.get(f"/api/behavior/student/{sid}", params=params, headers=admin_headers).json()
+        seen += [record["id"] for record in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    # Native dates newest first, then the not yet migrated string dates newest first
+    assert seen == ["r3", "r1", "r0", "r4", "r2"]
@@ -0,0 +1,47 @@
+import base64
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor, keyset_after
+
+
+def test_cursor_round_trip():
+    values = ["2/ب", "سارة", "0b6f2c1e"]
+    assert decode_cursor(encode_cursor(values), 3) == values
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(["???>>>", "~~~"])
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "%%%",
+    base64.urlsafe_b64encode(b"{not json").decode("ascii"),
+    base64.urlsafe_b64encode(b'{"a": 1}').decode("ascii"),
+    encode_cursor(["only", "two"]),
+    encode_cursor([{"$regex": "."}, "name", "id"]),
+    encode_cursor(["1/أ", {"$gt": ""}, "id"]),
+    encode_cursor(["1/أ", ["nested"], "id"]),
+    encode_cursor(["1/أ", None, "id"]),
+])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, 3)
+    assert error.value.status_code == 400
+
+
+def test_cursor_accepts_scalars():
+    values = ["2024-03-01T00:00:00+00:00", 3, 1.5, True]
+    assert decode_cursor(encode_cursor(values), 4) == values
+
+
+def test_keyset_after_expands_to_lexicographic_comparison():
+    date = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert keyset_after(["date", "id"], [date, "r1"], ["$lt", "$gt"]) == {"$or": [
+        {"date": {"$lt": date}},
+        {"date": date, "id": {"$gt": "r1"}},
+    ]}
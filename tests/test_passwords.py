@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import passwords
+import server
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def test_hash_and_verify():
+    hashed = passwords.hash_password("كلمة-سر")
+    assert passwords.verify_password("كلمة-سر", hashed)
+    assert not passwords.verify_password("other", hashed)
+
+
+def test_hash_passwords_keeps_order():
+    hashes = passwords.hash_passwords(["a", "b"])
+    assert [passwords.verify_password(p, h) for p, h in zip(["a", "b"], hashes)] == [True, True]
+
+
+def test_pool_runs_functions_that_do_not_import_the_app():
+    # The spawned pool workers unpickle these by module name
+    assert {f.__module__ for f in (server.hash_password, server.verify_password, server.hash_passwords)} == {"passwords"}
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, passwords; print(' '.join(sorted(sys.modules)))"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert not {"server", "motor", "fastapi", "prometheus_client", "orjson", "brotli"} & set(loaded)
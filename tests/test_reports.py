@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+ADMIN = {"role": "admin"}
+
+
+@pytest.mark.parametrize("report_type, days", [("weekly", 7), ("monthly", 30)])
+def test_report_window_starts_at_utc_midnight(report_type, days):
+    start_date, now = server.report_window(report_type, ADMIN)
+    assert start_date.tzinfo == timezone.utc
+    assert (start_date.hour, start_date.minute, start_date.second, start_date.microsecond) == (0, 0, 0, 0)
+    # Today and the days before it, days calendar days in all
+    assert (now.date() - start_date.date()).days == days - 1
+
+
+def legacy_record(record_id, student_id, behavior_type, points, date, created_at):
+    return {
+        "id": record_id, "student_id": student_id, "teacher_id": "t", "behavior_type": behavior_type,
+        "points": points, "description": "", "date": date, "created_at": created_at
+    }
+
+
+def report_rows(api, headers):
+    response = api.get("/api/reports/weekly", headers=headers)
+    assert response.status_code == 200
+    return {row["student_id"]: row for row in response.json()["data"]}
+
+
+def raw_report_rows(api):
+    # What the records fallback computes, to compare the rollups against
+    start_date, _ = server.report_window("weekly", ADMIN)
+    pipeline = server.build_report_pipeline({}, start_date, use_rollups=False)
+    return {row["student_id"]: row for row in api.portal.call(lambda: server.db.students.aggregate(pipeline).to_list(None))}
+
+
+def record(api, headers, student_id, behavior_type, points):
+    response = api.post("/api/behavior", json={
+        "student_id": student_id, "behavior_type": behavior_type, "points": points, "description": ""
+    }, headers=headers)
+    return response.json()["id"]
+
+
+def test_rollups_split_live_and_backfilled_counts(api, admin_headers, add_student):
+    student = add_student()
+    sid = student["id"]
+    live_since = server.rollup_state["live_since"]
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    before_live = live_since - timedelta(seconds=1)
+    api.portal.call(lambda: server.db.behavior_records.insert_many([
+        # Written before rollups went live, one of them before the date migration
+        legacy_record("L1", sid, "positive", 3, yesterday.isoformat(), before_live.isoformat()),
+        legacy_record("L2", sid, "negative", 2, yesterday, before_live),
+        legacy_record("L3", sid, "positive", 5, yesterday - timedelta(days=1), before_live),
+        # Outside the window
+        legacy_record("L4", sid, "positive", 7, yesterday - timedelta(days=9), before_live),
+    ]))
+    record(api, admin_headers, sid, "positive", 4)
+
+    # Until the backfill has run, reports count the raw records
+    assert api.get("/api/reports/weekly", headers=admin_headers).headers["etag"].endswith('.records"')
+    rows = report_rows(api, admin_headers)
+    assert (rows[sid]["positive_count"], rows[sid]["positive_points"], rows[sid]["negative_points"]) == (3, 12, 2)
+
+    # Deleting a legacy record before the backfill must not take it off the live counts
+    assert api.delete("/api/behavior/L3", headers=admin_headers).status_code == 200
+    api.portal.call(server.backfill_daily_rollups)
+    rows = report_rows(api, admin_headers)
+    assert api.get("/api/reports/weekly", headers=admin_headers).headers["etag"].endswith('.rollups"')
+    assert (rows[sid]["positive_count"], rows[sid]["positive_points"], rows[sid]["negative_points"]) == (2, 7, 2)
+    assert rows == raw_report_rows(api)
+
+    # Live writes and legacy deletes between runs, then a second run
+    record(api, admin_headers, sid, "negative", 1)
+    assert api.delete("/api/behavior/L1", headers=admin_headers).status_code == 200
+    assert report_rows(api, admin_headers) == raw_report_rows(api)
+    api.portal.call(server.backfill_daily_rollups)
+    rows = report_rows(api, admin_headers)
+    assert (rows[sid]["positive_count"], rows[sid]["negative_count"], rows[sid]["net_points"]) == (1, 2, 1)
+    assert rows == raw_report_rows(api)
+
+
+def test_report_counts_the_first_day_of_the_window_in_both_paths(api, admin_headers, add_student):
+    sid = add_student()["id"]
+    start_date, _ = server.report_window("weekly", ADMIN)
+    before_live = server.rollup_state["live_since"] - timedelta(seconds=1)
+    api.portal.call(lambda: server.db.behavior_records.insert_many([
+        legacy_record("first-day", sid, "positive", 1, start_date + timedelta(minutes=1), before_live),
+        legacy_record("day-before", sid, "positive", 2, start_date - timedelta(minutes=1), before_live),
+    ]))
+
+    assert report_rows(api, admin_headers)[sid]["positive_points"] == 1
+    api.portal.call(server.backfill_daily_rollups)
+    assert report_rows(api, admin_headers)[sid]["positive_points"] == 1
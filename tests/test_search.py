@@ -0,0 +1,57 @@
+import server
+
+
+def search(api, headers, q, **params):
+    response = api.get("/api/students/search", params={"q": q, **params}, headers=headers)
+    assert response.status_code == 200
+    return [student["name"] for student in response.json()["items"]]
+
+
+def add_legacy_student(api, name, class_name="1/أ"):
+    # As stored before name search existed: no name_normalized or name_tokens
+    student = server.Student(name=name, class_name=class_name).model_dump()
+    api.portal.call(lambda: server.db.students.insert_one(student))
+    return student
+
+
+def test_search_ranks_exact_then_prefix_then_token_matches(api, admin_headers, add_student):
+    for name in ("فاطمة الزهراء", "فاطمة", "زهراء علي", "نورة"):
+        add_student(name)
+    assert search(api, admin_headers, "فاطمه") == ["فاطمة", "فاطمة الزهراء"]
+    assert search(api, admin_headers, "زهراء") == ["زهراء علي", "فاطمة الزهراء"]
+
+
+def test_search_pages_with_a_cursor(api, admin_headers, add_student):
+    for i in range(5):
+        add_student(f"سارة {i}")
+    seen = []
+    cursor = None
+    while True:
+        params = {"q": "ساره", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = api.get("/api/students/search", params=params, headers=admin_headers).json()
+        seen += [student["name"] for student in page["items"]]
+        if not (cursor := page["next_cursor"]):
+            break
+    assert seen == [f"سارة {i}" for i in range(5)]
+
+
+def test_students_without_search_fields_are_found_until_indexed(api, admin_headers, add_student, monkeypatch):
+    monkeypatch.setitem(server.name_search_state, "indexed", False)
+    add_student("سارة أحمد")
+    add_legacy_student(api, "سارة محمد")
+    add_legacy_student(api, "هند سارة", class_name="2/ب")
+
+    assert search(api, admin_headers, "سارة") == ["سارة أحمد", "سارة محمد", "هند سارة"]
+    assert search(api, admin_headers, "سارة", class_name="1/أ") == ["سارة أحمد", "سارة محمد"]
+    unindexed_etag = api.get("/api/students/search", params={"q": "سارة"}, headers=admin_headers).headers["etag"]
+
+    # What each worker runs at startup
+    api.portal.call(server.index_student_names)
+    assert server.name_search_state["indexed"]
+    students = api.portal.call(lambda: server.db.students.find({}, {"_id": 0}).to_list(None))
+    assert all("name_tokens" in student for student in students)
+    # Now folded like every other name, and the tag no longer matches
+    assert search(api, admin_headers, "ساره") == ["سارة أحمد", "سارة محمد", "هند سارة"]
+    response = api.get("/api/students/search", params={"q": "سارة"},
+                       headers={**admin_headers, "If-None-Match": unindexed_etag})
+    assert response.status_code == 200
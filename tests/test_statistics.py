@@ -0,0 +1,40 @@
+import server
+
+
+def statistics(api, headers):
+    response = api.get("/api/statistics", headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_statistics_follow_every_write(api, admin_headers, add_student):
+    sid = add_student()["id"]
+    assert statistics(api, admin_headers)["total_positive_records"] == 0
+
+    api.post("/api/behavior", json={"student_id": sid, "behavior_type": "positive", "points": 4, "description": ""},
+             headers=admin_headers)
+    stats = statistics(api, admin_headers)
+    assert stats["total_positive_records"] == 1
+    assert stats["top_students"][0]["total_points"] == 4
+
+    # A write handled by another worker only shows up as a newer data version
+    api.portal.call(lambda: server.db.behavior_records.insert_one(
+        {"id": "elsewhere", "student_id": sid, "behavior_type": "negative", "points": 1, "description": ""}
+    ))
+    api.portal.call(server.data_versions.bump, "1/أ")
+    assert statistics(api, admin_headers)["total_negative_records"] == 1
+
+
+def test_statistics_are_reused_while_nothing_changes(api, admin_headers, add_student, monkeypatch):
+    add_student()
+    calls = []
+    compute = server.compute_statistics
+
+    async def counted(version):
+        calls.append(version)
+        return await compute(version)
+
+    monkeypatch.setattr(server, "compute_statistics", counted)
+    for _ in range(3):
+        statistics(api, admin_headers)
+    assert len(calls) == 1
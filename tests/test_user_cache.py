@@ -0,0 +1,40 @@
+import server
+from server import UserCache
+
+
+def test_user_cache_returns_copies():
+    cache = UserCache(max_size=2, ttl_seconds=60)
+    cache.put({"id": "u1", "role": "teacher"})
+    cache.get("u1")["role"] = "admin"
+    assert cache.get("u1") == {"id": "u1", "role": "teacher"}
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_user_cache_evicts_least_recently_used():
+    cache = UserCache(max_size=2, ttl_seconds=60)
+    cache.put({"id": "u1"})
+    cache.put({"id": "u2"})
+    cache.get("u1")
+    cache.put({"id": "u3"})
+    assert cache.get("u2") is None
+    assert cache.get("u1") is not None and cache.get("u3") is not None
+
+
+def test_user_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    cache = UserCache(max_size=2, ttl_seconds=30)
+    cache.put({"id": "u1"})
+    now[0] += 29
+    assert cache.get("u1") is not None
+    now[0] += 2
+    assert cache.get("u1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_user_cache_invalidate():
+    cache = UserCache(max_size=2, ttl_seconds=60)
+    cache.put({"id": "u1"})
+    cache.invalidate("u1")
+    cache.invalidate("u1")
+    assert cache.get("u1") is None